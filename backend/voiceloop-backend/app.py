@@ -1,11 +1,15 @@
 import os
 import sys
-from flask import Flask, request, jsonify, send_from_directory
+import logging
+from flask import Blueprint, Flask, Response, request, jsonify, send_from_directory, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+import time
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 import uuid
 import json
+import orjson
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -14,43 +18,96 @@ load_dotenv()
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'voiceloop-secret-key-2024')
-app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size
-
-# Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv(
-    'DATABASE_URL', 
-    f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'voiceloop.db')}"
-)
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+class ORJSONProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson for faster serialization of large listings"""
+    
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        # Datetimes fall through to Flask's default so the wire format is unchanged
+        return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
-# Enable CORS
-CORS(app, origins=["http://localhost:5173", "http://localhost:3000", "https://main.d1fx10pzvtm51o.amplifyapp.com", "*"])
+logger = logging.getLogger('voiceloop.api')
 
-# Initialize database
-db = SQLAlchemy(app)
+# Routes live on a blueprint so that importing this module has no side effects.
+# PDF worker processes are spawned and re-import the launching script; building the
+# services here would load the models again and open the databases from every worker.
+api = Blueprint('api', __name__)
 
-# Import models and services
+from models.database import db
 from models.document_models import UploadedFile, DocumentAnalysis, ProcessingJob
 from models.knowledge_models import KnowledgeDocument, ContentChunk, SearchQuery
-from models.calendar_models import CalendarEvent, CalendarIntegration
-from services.file_processor import FileProcessingService
-from services.rag_service import RAGService
-from services.mcp_calendar import MCPCalendarService
-from services.auth_service import AuthService
-
-# Initialize services
-file_processor = FileProcessingService()
-rag_service = RAGService()
-mcp_calendar = MCPCalendarService()
-auth_service = AuthService()
-
-# Create database tables
-with app.app_context():
-    db.create_all()
-
-@app.route('/api/health', methods=['GET'])
+from models.calendar_models import CalendarEvent, CalendarIntegration, MCPCommand
+
+# Set by create_app
+file_processor = None
+rag_service = None
+mcp_calendar = None
+auth_service = None
+telemetry_service = None
+
+def create_app():
+    """Build the Flask app, its services and database tables"""
+    global file_processor, rag_service, mcp_calendar, auth_service, telemetry_service
+    
+    # Imported here so spawned workers never pull in the model libraries through this module
+    from services.file_processor import FileProcessingService
+    from services.rag_service import RAGService
+    from services.mcp_calendar import MCPCalendarService
+    from services.auth_service import AuthService
+    from services.telemetry_service import TelemetryService
+    
+    app = Flask(__name__)
+    app.json = ORJSONProvider(app)
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'voiceloop-secret-key-2024')
+    app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size
+    
+    # Database configuration
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv(
+        'DATABASE_URL', 
+        f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'voiceloop.db')}"
+    )
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    
+    # Connection pool sizing for server databases (SQLite manages its own pool)
+    if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'pool_size': int(os.getenv('DB_POOL_SIZE', 20)),
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 40)),
+            'pool_pre_ping': True,  # Drop stale connections before use
+            'pool_recycle': 1800
+        }
+    
+    # Enable CORS
+    CORS(app, origins=["http://localhost:5173", "http://localhost:3000", "https://main.d1fx10pzvtm51o.amplifyapp.com", "*"])
+    
+    # Initialize database; the models declare their tables on this shared instance
+    db.init_app(app)
+    
+    # Initialize services
+    rag_service = RAGService()
+    file_processor = FileProcessingService(rag_service)
+    mcp_calendar = MCPCalendarService()
+    auth_service = AuthService()
+    telemetry_service = TelemetryService()
+    
+    # Create database tables
+    with app.app_context():
+        db.create_all()
+    
+    # Telemetry rows are written in batches off the request path
+    telemetry_service.start(app, db)
+    
+    app.register_blueprint(api)
+    return app
+
+@api.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
@@ -60,7 +117,7 @@ def health_check():
         'version': '1.0.0'
     })
 
-@app.route('/api/upload', methods=['POST'])
+@api.route('/api/upload', methods=['POST'])
 def upload_file():
     """Handle file uploads with AI processing"""
     try:
@@ -80,14 +137,62 @@ def upload_file():
         return jsonify({
             'success': True,
             'file_id': result['file_id'],
-            'analysis': result['analysis'],
-            'message': 'File processed successfully'
+            'processing_status': result['processing_status'],
+            'message': 'File uploaded; analysis in progress'
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/upload/batch', methods=['POST'])
+def upload_files():
+    """Handle multi-file uploads, analysing all files concurrently"""
+    try:
+        files = [file for file in request.files.getlist('files') if file.filename]
+        if not files:
+            return jsonify({'error': 'No files provided'}), 400
+        
+        # Get user ID from request (in production, extract from JWT)
+        user_id = request.form.get('user_id', str(uuid.uuid4()))
+        
+        results = file_processor.process_files(files, user_id)
+        
+        return jsonify({
+            'success': True,
+            'files': [
+                {'file_id': result['file_id'], 'filename': result['filename'],
+                 'processing_status': result['processing_status']}
+                for result in results
+            ],
+            'message': 'Files uploaded; analysis in progress'
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/documents', methods=['GET'])
+@api.route('/api/files/<file_id>/analysis', methods=['GET'])
+def get_file_analysis(file_id):
+    """Wait for the background AI analysis of an uploaded file"""
+    try:
+        timeout = float(request.args.get('timeout', 30))
+        
+        try:
+            result = file_processor.get_analysis(file_id, timeout=timeout)
+        except FuturesTimeoutError:
+            return jsonify({
+                'file_id': file_id,
+                'processing_status': 'processing'
+            }), 202
+        
+        if result is None:
+            return jsonify({'error': 'Analysis not found'}), 404
+        
+        return jsonify(result)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/documents', methods=['GET'])
 def get_documents():
     """Get all documents for a user"""
     try:
@@ -95,7 +200,15 @@ def get_documents():
         if not user_id:
             return jsonify({'error': 'User ID required'}), 400
         
-        documents = UploadedFile.query.filter_by(user_id=user_id).all()
+        # Stream rows in batches so only one batch of instances is alive at a time.
+        # to_dict() reads `analysis`, so preload it; any other lazy load raises
+        # instead of silently issuing one query per row.
+        documents = (
+            UploadedFile.query
+            .options(db.selectinload(UploadedFile.analysis), db.raiseload('*'))
+            .filter_by(user_id=user_id)
+            .yield_per(500)
+        )
         return jsonify({
             'documents': [doc.to_dict() for doc in documents]
         })
@@ -103,7 +216,7 @@ def get_documents():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/documents/<file_id>', methods=['GET'])
+@api.route('/api/documents/<file_id>', methods=['GET'])
 def get_document(file_id):
     """Get specific document details"""
     try:
@@ -116,7 +229,7 @@ def get_document(file_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/rag/search', methods=['POST'])
+@api.route('/api/rag/search', methods=['POST'])
 def search_knowledge_base():
     """Search knowledge base using RAG"""
     try:
@@ -127,8 +240,18 @@ def search_knowledge_base():
         if not query or not user_id:
             return jsonify({'error': 'Query and user_id required'}), 400
         
+        started = time.perf_counter()
         results = rag_service.search(query, user_id)
         
+        telemetry_service.enqueue(SearchQuery, {
+            'user_id': user_id,
+            'query_text': query,
+            'query_type': 'hybrid',
+            'results_count': len(results),
+            'execution_time_ms': int((time.perf_counter() - started) * 1000),
+            'ai_enhanced': bool(results) and ('ai_analysis' in results[0] or 'analysis_id' in results[0])
+        })
+        
         return jsonify({
             'results': results,
             'query': query
@@ -137,7 +260,29 @@ def search_knowledge_base():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/calendar/events', methods=['GET'])
+@api.route('/api/rag/analysis/<analysis_id>', methods=['GET'])
+def get_search_analysis(analysis_id):
+    """Wait for the background AI analysis of a search"""
+    try:
+        timeout = float(request.args.get('timeout', 30))
+        
+        try:
+            result = rag_service.get_search_analysis(analysis_id, timeout=timeout)
+        except FuturesTimeoutError:
+            return jsonify({
+                'analysis_id': analysis_id,
+                'processing_status': 'processing'
+            }), 202
+        
+        if result is None:
+            return jsonify({'error': 'Analysis not found'}), 404
+        
+        return jsonify(result)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/calendar/events', methods=['GET'])
 def get_calendar_events():
     """Get calendar events"""
     try:
@@ -154,7 +299,7 @@ def get_calendar_events():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/calendar/events', methods=['POST'])
+@api.route('/api/calendar/events', methods=['POST'])
 def create_calendar_event():
     """Create calendar event using MCP"""
     try:
@@ -175,7 +320,7 @@ def create_calendar_event():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/calendar/natural-language', methods=['POST'])
+@api.route('/api/calendar/natural-language', methods=['POST'])
 def process_natural_language():
     """Process natural language calendar commands using MCP"""
     try:
@@ -186,8 +331,20 @@ def process_natural_language():
         if not user_id or not command:
             return jsonify({'error': 'User ID and command required'}), 400
         
+        started = time.perf_counter()
         result = mcp_calendar.process_natural_language(user_id, command)
         
+        telemetry_service.enqueue(MCPCommand, {
+            'user_id': user_id,
+            'command_text': command,
+            'command_type': 'calendar',
+            'parsed_intent': json.dumps(result.get('intent', {}), default=str),
+            'execution_result': json.dumps(result.get('result', {}), default=str),
+            'success': result.get('success', False),
+            'execution_time_ms': int((time.perf_counter() - started) * 1000),
+            'error_message': result.get('error')
+        })
+        
         return jsonify({
             'success': True,
             'result': result
@@ -196,7 +353,7 @@ def process_natural_language():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/voice/transcribe', methods=['POST'])
+@api.route('/api/voice/transcribe', methods=['POST'])
 def transcribe_audio():
     """Transcribe audio using OpenAI Whisper"""
     try:
@@ -217,7 +374,29 @@ def transcribe_audio():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@api.route('/api/voice/transcribe/stream', methods=['POST'])
+def stream_transcribe_audio():
+    """Transcribe raw 16 kHz mono 16-bit PCM as it arrives, streaming back stable words"""
+    try:
+        audio_chunks = file_processor.read_pcm16_stream(request.stream)
+        words = file_processor.stream_transcribe(audio_chunks)
+        
+        return Response(stream_with_context(_relay_stream(words)), mimetype='text/plain')
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _relay_stream(words):
+    """Relay streamed words, ending the body with a JSON error line if the stream fails"""
+    try:
+        yield from words
+    except Exception as e:
+        # The 200 status is already sent, so the error can only be reported in the body
+        logger.exception("Streaming transcription failed")
+        yield '\n' + json.dumps({'error': str(e)}) + '\n'
+
 if __name__ == '__main__':
+    app = create_app()
     port = int(os.getenv('PORT', 5000))
     debug = os.getenv('FLASK_ENV') == 'development'
     
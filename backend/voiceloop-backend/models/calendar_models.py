@@ -1,14 +1,12 @@
-from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-import uuid
 import json
 
-db = SQLAlchemy()
+from models.database import db, _new_id
 
 class CalendarEvent(db.Model):
     __tablename__ = 'calendar_events'
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(db.String(36), primary_key=True, default=_new_id)
     user_id = db.Column(db.String(36), nullable=False)
     title = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text, nullable=True)
@@ -19,9 +17,9 @@ class CalendarEvent(db.Model):
     event_type = db.Column(db.String(100), default='meeting')  # meeting, reminder, task, event
     priority = db.Column(db.String(20), default='medium')  # low, medium, high, urgent
     status = db.Column(db.String(20), default='scheduled')  # scheduled, confirmed, cancelled, completed
-    created_timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_timestamp = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    metadata = db.Column(db.Text, nullable=True)  # JSON string for additional data
+    created_timestamp = db.Column(db.DateTime, default=datetime.utcnow, server_default=db.func.now())
+    updated_timestamp = db.Column(db.DateTime, default=datetime.utcnow, server_default=db.func.now(), onupdate=db.func.now())
+    metadata_json = db.Column('metadata', db.Text, nullable=True)  # JSON string for additional data
     external_id = db.Column(db.String(255), nullable=True)  # For external calendar sync
     source = db.Column(db.String(100), default='voiceloop')  # voiceloop, google, outlook, etc.
     
@@ -32,13 +30,13 @@ class CalendarEvent(db.Model):
     def get_metadata(self):
         """Return metadata as a dictionary"""
         try:
-            return json.loads(self.metadata) if self.metadata else {}
+            return json.loads(self.metadata_json) if self.metadata_json else {}
         except json.JSONDecodeError:
             return {}
     
     def set_metadata(self, metadata_dict):
         """Set metadata from a dictionary"""
-        self.metadata = json.dumps(metadata_dict)
+        self.metadata_json = json.dumps(metadata_dict)
     
     def to_dict(self):
         return {
@@ -65,7 +63,7 @@ class CalendarEvent(db.Model):
 class EventAttendee(db.Model):
     __tablename__ = 'event_attendees'
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(db.String(36), primary_key=True, default=_new_id)
     event_id = db.Column(db.String(36), db.ForeignKey('calendar_events.id'), nullable=False)
     email = db.Column(db.String(255), nullable=False)
     name = db.Column(db.String(255), nullable=True)
@@ -87,7 +85,7 @@ class EventAttendee(db.Model):
 class EventReminder(db.Model):
     __tablename__ = 'event_reminders'
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(db.String(36), primary_key=True, default=_new_id)
     event_id = db.Column(db.String(36), db.ForeignKey('calendar_events.id'), nullable=False)
     reminder_time = db.Column(db.DateTime, nullable=False)
     reminder_type = db.Column(db.String(50), default='notification')  # notification, email, sms
@@ -109,7 +107,7 @@ class EventReminder(db.Model):
 class CalendarIntegration(db.Model):
     __tablename__ = 'calendar_integrations'
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(db.String(36), primary_key=True, default=_new_id)
     user_id = db.Column(db.String(36), nullable=False)
     provider = db.Column(db.String(100), nullable=False)  # google, outlook, apple, etc.
     integration_type = db.Column(db.String(50), default='oauth')  # oauth, api_key, webhook
@@ -117,9 +115,9 @@ class CalendarIntegration(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     last_sync_timestamp = db.Column(db.DateTime, nullable=True)
     sync_frequency = db.Column(db.Integer, default=15)  # minutes
-    created_timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_timestamp = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    metadata = db.Column(db.Text, nullable=True)  # JSON string for additional config
+    created_timestamp = db.Column(db.DateTime, default=datetime.utcnow, server_default=db.func.now())
+    updated_timestamp = db.Column(db.DateTime, default=datetime.utcnow, server_default=db.func.now(), onupdate=db.func.now())
+    metadata_json = db.Column('metadata', db.Text, nullable=True)  # JSON string for additional config
     
     def get_credentials(self):
         """Return credentials as a dictionary"""
@@ -135,13 +133,13 @@ class CalendarIntegration(db.Model):
     def get_metadata(self):
         """Return metadata as a dictionary"""
         try:
-            return json.loads(self.metadata) if self.metadata else {}
+            return json.loads(self.metadata_json) if self.metadata_json else {}
         except json.JSONDecodeError:
             return {}
     
     def set_metadata(self, metadata_dict):
         """Set metadata from a dictionary"""
-        self.metadata = json.dumps(metadata_dict)
+        self.metadata_json = json.dumps(metadata_dict)
     
     def to_dict(self):
         return {
@@ -160,7 +158,7 @@ class CalendarIntegration(db.Model):
 class MCPCommand(db.Model):
     __tablename__ = 'mcp_commands'
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(db.String(36), primary_key=True, default=_new_id)
     user_id = db.Column(db.String(36), nullable=False)
     command_text = db.Column(db.Text, nullable=False)
     command_type = db.Column(db.String(50), nullable=False)  # calendar, document, search, etc.
@@ -168,7 +166,7 @@ class MCPCommand(db.Model):
     execution_result = db.Column(db.Text, nullable=True)  # JSON string
     success = db.Column(db.Boolean, default=False)
     execution_time_ms = db.Column(db.Integer, default=0)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, server_default=db.func.now())
     error_message = db.Column(db.Text, nullable=True)
     
     def get_parsed_intent(self):
@@ -0,0 +1,11 @@
+import uuid
+
+from flask_sqlalchemy import SQLAlchemy
+
+# One SQLAlchemy instance for every model module, bound to the app with init_app,
+# so create_all sees all tables and cross-module foreign keys resolve
+db = SQLAlchemy()
+
+def _new_id():
+    """Generate a primary key as a 32-char hex UUID"""
+    return uuid.uuid4().hex
@@ -1,14 +1,12 @@
-from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-import uuid
 import json
 
-db = SQLAlchemy()
+from models.database import db, _new_id
 
 class UploadedFile(db.Model):
     __tablename__ = 'uploaded_files'
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(db.String(36), primary_key=True, default=_new_id)
     filename = db.Column(db.String(255), nullable=False)
     original_filename = db.Column(db.String(255), nullable=False)
     file_path = db.Column(db.String(500), nullable=False)
@@ -16,7 +14,7 @@ class UploadedFile(db.Model):
     mime_type = db.Column(db.String(100), nullable=False)
     file_hash = db.Column(db.String(64), nullable=False)
     user_id = db.Column(db.String(36), nullable=False)
-    upload_timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    upload_timestamp = db.Column(db.DateTime, default=datetime.utcnow, server_default=db.func.now())
     processing_status = db.Column(db.String(50), default='pending')  # pending, processing, completed, failed
     is_active = db.Column(db.Boolean, default=True)
     
@@ -41,9 +39,9 @@ class UploadedFile(db.Model):
 class DocumentAnalysis(db.Model):
     __tablename__ = 'document_analyses'
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(db.String(36), primary_key=True, default=_new_id)
     file_id = db.Column(db.String(36), db.ForeignKey('uploaded_files.id'), nullable=False)
-    extracted_text = db.Column(db.Text, nullable=True)
+    extracted_text = db.deferred(db.Column(db.Text, nullable=True))  # Loaded on access only
     summary = db.Column(db.Text, nullable=True)
     key_points = db.Column(db.Text, nullable=True)  # JSON string
     document_type = db.Column(db.String(100), nullable=True)
@@ -54,7 +52,7 @@ class DocumentAnalysis(db.Model):
     category = db.Column(db.String(100), nullable=True)
     relevance_score = db.Column(db.Float, nullable=True)
     confidence_score = db.Column(db.Float, nullable=True)
-    analysis_timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    analysis_timestamp = db.Column(db.DateTime, default=datetime.utcnow, server_default=db.func.now())
     ai_model_used = db.Column(db.String(100), nullable=True)
     
     def get_key_points(self):
@@ -79,11 +77,10 @@ class DocumentAnalysis(db.Model):
         """Set tags from a list"""
         self.tags = json.dumps(tags_list)
     
-    def to_dict(self):
-        return {
+    def to_dict(self, include_full_text=False):
+        data = {
             'id': self.id,
             'file_id': self.file_id,
-            'extracted_text': self.extracted_text,
             'summary': self.summary,
             'key_points': self.get_key_points(),
             'document_type': self.document_type,
@@ -97,32 +94,35 @@ class DocumentAnalysis(db.Model):
             'analysis_timestamp': self.analysis_timestamp.isoformat() if self.analysis_timestamp else None,
             'ai_model_used': self.ai_model_used
         }
+        if include_full_text:
+            data['extracted_text'] = self.extracted_text
+        return data
 
 class ProcessingJob(db.Model):
     __tablename__ = 'processing_jobs'
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(db.String(36), primary_key=True, default=_new_id)
     file_id = db.Column(db.String(36), db.ForeignKey('uploaded_files.id'), nullable=False)
     job_type = db.Column(db.String(100), nullable=False)  # text_extraction, ai_analysis, embedding_generation
     status = db.Column(db.String(50), default='queued')  # queued, running, completed, failed
     priority = db.Column(db.Integer, default=1)  # 1=low, 5=high
-    created_timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    created_timestamp = db.Column(db.DateTime, default=datetime.utcnow, server_default=db.func.now())
     started_timestamp = db.Column(db.DateTime, nullable=True)
     completed_timestamp = db.Column(db.DateTime, nullable=True)
     error_message = db.Column(db.Text, nullable=True)
     progress_percentage = db.Column(db.Integer, default=0)
-    metadata = db.Column(db.Text, nullable=True)  # JSON string
+    metadata_json = db.Column('metadata', db.Text, nullable=True)  # JSON string
     
     def get_metadata(self):
         """Return metadata as a dictionary"""
         try:
-            return json.loads(self.metadata) if self.metadata else {}
+            return json.loads(self.metadata_json) if self.metadata_json else {}
         except json.JSONDecodeError:
             return {}
     
     def set_metadata(self, metadata_dict):
         """Set metadata from a dictionary"""
-        self.metadata = json.dumps(metadata_dict)
+        self.metadata_json = json.dumps(metadata_dict)
     
     def to_dict(self):
         return {
@@ -1,19 +1,17 @@
-from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-import uuid
 import json
 
-db = SQLAlchemy()
+from models.database import db, _new_id
 
 class KnowledgeDocument(db.Model):
     __tablename__ = 'knowledge_documents'
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(db.String(36), primary_key=True, default=_new_id)
     source_file_id = db.Column(db.String(36), db.ForeignKey('uploaded_files.id'), nullable=False)
     title = db.Column(db.String(255), nullable=False)
     content_hash = db.Column(db.String(64), nullable=False)
-    metadata = db.Column(db.Text, nullable=False)  # JSON string
-    created_timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    metadata_json = db.deferred(db.Column('metadata', db.Text, nullable=False))  # JSON string, loaded on access only
+    created_timestamp = db.Column(db.DateTime, default=datetime.utcnow, server_default=db.func.now())
     user_id = db.Column(db.String(36), nullable=False)
     is_active = db.Column(db.Boolean, default=True)
     document_type = db.Column(db.String(100), nullable=True)
@@ -26,13 +24,13 @@ class KnowledgeDocument(db.Model):
     def get_metadata(self):
         """Return metadata as a dictionary"""
         try:
-            return json.loads(self.metadata) if self.metadata else {}
+            return json.loads(self.metadata_json) if self.metadata_json else {}
         except json.JSONDecodeError:
             return {}
     
     def set_metadata(self, metadata_dict):
         """Set metadata from a dictionary"""
-        self.metadata = json.dumps(metadata_dict)
+        self.metadata_json = json.dumps(metadata_dict)
     
     def get_tags(self):
         """Return tags as a list"""
@@ -45,13 +43,12 @@ class KnowledgeDocument(db.Model):
         """Set tags from a list"""
         self.tags = json.dumps(tags_list)
     
-    def to_dict(self):
-        return {
+    def to_dict(self, include_metadata=False):
+        data = {
             'id': self.id,
             'source_file_id': self.source_file_id,
             'title': self.title,
             'content_hash': self.content_hash,
-            'metadata': self.get_metadata(),
             'created_timestamp': self.created_timestamp.isoformat() if self.created_timestamp else None,
             'user_id': self.user_id,
             'is_active': self.is_active,
@@ -60,18 +57,21 @@ class KnowledgeDocument(db.Model):
             'tags': self.get_tags(),
             'chunk_count': len(self.chunks)
         }
+        if include_metadata:
+            data['metadata'] = self.get_metadata()
+        return data
 
 class ContentChunk(db.Model):
     __tablename__ = 'content_chunks'
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(db.String(36), primary_key=True, default=_new_id)
     document_id = db.Column(db.String(36), db.ForeignKey('knowledge_documents.id'), nullable=False)
-    chunk_text = db.Column(db.Text, nullable=False)
+    chunk_text = db.deferred(db.Column(db.Text, nullable=False))  # Loaded on access only
     chunk_index = db.Column(db.Integer, nullable=False)
     start_position = db.Column(db.Integer, default=0)
     end_position = db.Column(db.Integer, default=0)
     chunk_metadata = db.Column(db.Text, nullable=True)  # JSON string
-    created_timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    created_timestamp = db.Column(db.DateTime, default=datetime.utcnow, server_default=db.func.now())
     embedding_id = db.Column(db.String(100), nullable=True)  # Reference to vector store
     relevance_score = db.Column(db.Float, nullable=True)
     
@@ -86,11 +86,10 @@ class ContentChunk(db.Model):
         """Set chunk metadata from a dictionary"""
         self.chunk_metadata = json.dumps(metadata_dict)
     
-    def to_dict(self):
-        return {
+    def to_dict(self, include_full_text=False):
+        data = {
             'id': self.id,
             'document_id': self.document_id,
-            'chunk_text': self.chunk_text,
             'chunk_index': self.chunk_index,
             'start_position': self.start_position,
             'end_position': self.end_position,
@@ -99,17 +98,20 @@ class ContentChunk(db.Model):
             'embedding_id': self.embedding_id,
             'relevance_score': self.relevance_score
         }
+        if include_full_text:
+            data['chunk_text'] = self.chunk_text
+        return data
 
 class SearchQuery(db.Model):
     __tablename__ = 'search_queries'
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(db.String(36), primary_key=True, default=_new_id)
     user_id = db.Column(db.String(36), nullable=False)
     query_text = db.Column(db.Text, nullable=False)
     query_type = db.Column(db.String(50), default='semantic')  # 'semantic', 'keyword', 'hybrid'
     results_count = db.Column(db.Integer, default=0)
     execution_time_ms = db.Column(db.Integer, default=0)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, server_default=db.func.now())
     filters = db.Column(db.Text, nullable=True)  # JSON string
     ai_enhanced = db.Column(db.Boolean, default=False)
     
@@ -140,12 +142,12 @@ class SearchQuery(db.Model):
 class VectorEmbedding(db.Model):
     __tablename__ = 'vector_embeddings'
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(db.String(36), primary_key=True, default=_new_id)
     chunk_id = db.Column(db.String(36), db.ForeignKey('content_chunks.id'), nullable=False)
-    embedding_vector = db.Column(db.Text, nullable=False)  # JSON string of vector
+    embedding_vector = db.deferred(db.Column(db.Text, nullable=False))  # JSON string of vector, loaded on access only
     model_name = db.Column(db.String(100), nullable=False)
     embedding_dimension = db.Column(db.Integer, nullable=False)
-    created_timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    created_timestamp = db.Column(db.DateTime, default=datetime.utcnow, server_default=db.func.now())
     is_active = db.Column(db.Boolean, default=True)
     
     def get_embedding_vector(self):
@@ -159,13 +161,15 @@ class VectorEmbedding(db.Model):
         """Set embedding vector from a list"""
         self.embedding_vector = json.dumps(vector_list)
     
-    def to_dict(self):
-        return {
+    def to_dict(self, include_vector=False):
+        data = {
             'id': self.id,
             'chunk_id': self.chunk_id,
-            'embedding_vector': self.get_embedding_vector(),
             'model_name': self.model_name,
             'embedding_dimension': self.embedding_dimension,
             'created_timestamp': self.created_timestamp.isoformat() if self.created_timestamp else None,
             'is_active': self.is_active
         }
+        if include_vector:
+            data['embedding_vector'] = self.get_embedding_vector()
+        return data
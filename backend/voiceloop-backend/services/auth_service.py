@@ -1,10 +1,17 @@
 import os
 import jwt
+import time
 import uuid
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Dict, Any, Optional
 from jose import JWTError, jwt as jose_jwt
 
+@lru_cache(maxsize=4096)
+def _decode_cached(token: str, secret_key: str, algorithm: str) -> Dict[str, Any]:
+    """Decode a JWT once per token; callers must re-check expiry on cache hits"""
+    return jwt.decode(token, secret_key, algorithms=[algorithm])
+
 class AuthService:
     def __init__(self):
         self.secret_key = os.getenv('JWT_SECRET_KEY', 'voiceloop-secret-key-2024')
@@ -31,10 +38,16 @@ class AuthService:
     def verify_token(self, token: str) -> Optional[Dict[str, Any]]:
         """Verify and decode a JWT token"""
         try:
-            payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
-            return payload
+            payload = _decode_cached(token, self.secret_key, self.algorithm)
         except JWTError:
             return None
+        
+        # Cached payloads skip the signature check, so expiry must be enforced here
+        exp = payload.get("exp")
+        if exp is not None and exp <= time.time():
+            return None
+        
+        return dict(payload)
     
     def get_current_user(self, token: str) -> Optional[Dict[str, Any]]:
         """Get current user from token"""
@@ -1,20 +1,87 @@
 import os
 import io
+import asyncio
+import codecs
 import json
 import uuid
 import hashlib
+import tempfile
 import mimetypes
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple, Any
-import PyPDF2
+from types import SimpleNamespace
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Any
+import numpy as np
+import pypdfium2 as pdfium
 from docx import Document
+import charset_normalizer
+import ctranslate2
 import openai
-from openai import OpenAI
-import whisper
+from openai import AsyncOpenAI, OpenAI
+from faster_whisper import WhisperModel, BatchedInferencePipeline
+
+ANALYSIS_SYSTEM_PROMPT = (
+    "You are an expert document analyst. Reply with a JSON object with keys: "
+    "summary (2-3 sentences), key_points (5-7 strings), category (string), "
+    "tags (list of strings), reading_time_minutes (integer), "
+    "quality_score (0-1), suggested_actions (list of strings)."
+)
+
+# PDFs with at least this many pages are split across worker processes
+PDF_PARALLEL_MIN_PAGES = 8
+PDF_MAX_WORKERS = min(8, os.cpu_count() or 1)
+
+# Streaming transcription: 16 kHz mono audio, re-decoded every second of new input.
+# Agreed audio is trimmed once the buffer passes STREAM_TRIM_SECONDS and the
+# buffer never grows past Whisper's 30 s window.
+STREAM_SAMPLE_RATE = 16000
+STREAM_ROUND_SECONDS = 1.0
+STREAM_TRIM_SECONDS = 15.0
+STREAM_MAX_BUFFER_SECONDS = 30.0
+
+_pdf_executor = None
+
+def _get_pdf_executor() -> ProcessPoolExecutor:
+    """Return the shared PDF worker pool, creating it on first use"""
+    global _pdf_executor
+    if _pdf_executor is None:
+        # spawn avoids forking a parent that already holds model and HTTP threads.
+        # Spawned workers re-import the launching script, which is why app.py
+        # builds its services in create_app rather than at import.
+        _pdf_executor = ProcessPoolExecutor(
+            max_workers=PDF_MAX_WORKERS,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    return _pdf_executor
+
+def _extract_pdf_page_text(page) -> str:
+    """Extract one page's text with PDFium, normalising its CRLF line endings"""
+    textpage = page.get_textpage()
+    try:
+        return textpage.get_text_bounded().replace("\r\n", "\n")
+    finally:
+        textpage.close()
+        page.close()
+
+def _extract_pdf_page_range(path: str, start: int, stop: int) -> List[str]:
+    """Extract text for pages [start, stop) with a document private to this worker"""
+    # Opened by path, PDFium reads only the pages it needs through the page cache
+    pdf = pdfium.PdfDocument(path)
+    try:
+        return [_extract_pdf_page_text(pdf[i]) for i in range(start, stop)]
+    finally:
+        pdf.close()
 
 class FileProcessingService:
-    def __init__(self):
+    DANGEROUS_EXTENSIONS = frozenset({'.exe', '.bat', '.cmd', '.scr', '.pif', '.com', '.vbs', '.js'})
+    
+    def __init__(self, rag_service=None):
         self.client = OpenAI()
+        # Uploaded text is indexed into this RAGService's knowledge base when one is given
+        self.rag_service = rag_service
         self.whisper_model = None
         self.supported_document_types = {
             'application/pdf': 'pdf',
@@ -31,7 +98,24 @@ class FileProcessingService:
             'audio/webm': 'webm',
             'audio/ogg': 'ogg'
         }
+        self.supported_types = frozenset(self.supported_document_types) | frozenset(self.supported_audio_types)
         self.max_file_size = 100 * 1024 * 1024  # 100MB limit
+        self.analysis_model = "gpt-4o-mini"
+        
+        # AI analysis results keyed by (file hash, model) so duplicate uploads skip OpenAI
+        self.analysis_cache = OrderedDict()
+        self.analysis_cache_size = 1024
+        
+        # Transcripts keyed by file hash so re-uploaded audio skips Whisper
+        self.transcription_cache = OrderedDict()
+        self.transcription_cache_size = 256
+        self._cache_lock = threading.Lock()
+        
+        # AI analysis and RAG indexing run in the background, keyed by file ID
+        self.executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='file-analysis')
+        self.analysis_futures = OrderedDict()
+        self.analysis_futures_size = 1024
+        self._analysis_futures_lock = threading.Lock()
         
         # Initialize Whisper model for audio transcription
         self._initialize_whisper()
@@ -39,61 +123,173 @@ class FileProcessingService:
     def _initialize_whisper(self):
         """Initialize Whisper model for audio transcription"""
         try:
-            # Use smaller model for faster processing
-            self.whisper_model = whisper.load_model("base")
+            # Use smaller model for faster processing; the batched pipeline
+            # decodes VAD-split segments of one file in parallel.
+            # WHISPER_MODEL may also point at a pre-converted int8 CTranslate2 directory.
+            # num_workers lets concurrent requests share this one loaded model in parallel.
+            device = os.getenv('WHISPER_DEVICE') or 'auto'
+            if device == 'auto':
+                device = 'cuda' if ctranslate2.get_cuda_device_count() > 0 else 'cpu'
+            # float16 suits GPUs; int8 is fastest on CPU
+            compute_type = os.getenv('WHISPER_COMPUTE_TYPE') or ('float16' if device == 'cuda' else 'int8')
+            
+            model = WhisperModel(
+                os.getenv('WHISPER_MODEL', 'base'),
+                device=device,
+                compute_type=compute_type,
+                num_workers=int(os.getenv('WHISPER_NUM_WORKERS', 2))
+            )
+            self.whisper_model = BatchedInferencePipeline(model=model)
         except Exception as e:
             print(f"Failed to initialize Whisper model: {e}")
             self.whisper_model = None
+            return
+        
+        self._warm_up_whisper()
+    
+    def _warm_up_whisper(self):
+        """Run one dummy transcription so the first real request doesn't pay for it"""
+        try:
+            # 15 s of silence at 16 kHz; VAD would drop it all, so decode it in full
+            silence = np.zeros(16000 * 15, dtype=np.float32)
+            segments, _ = self.whisper_model.transcribe(silence, batch_size=1, vad_filter=False)
+            list(segments)
+        except Exception as e:
+            print(f"Whisper warm-up failed: {e}")
     
     def process_file(self, file, user_id: str) -> Dict[str, Any]:
         """Process uploaded file with AI analysis"""
         try:
-            # Validate file
-            is_valid, validation_message = self.validate_file(file)
-            if not is_valid:
-                raise Exception(validation_message)
-            
-            # Generate file ID and metadata
-            file_id = str(uuid.uuid4())
-            file_hash = self._calculate_file_hash(file)
-            
-            # Extract text content
-            text_content = self.extract_text_from_file(file)
-            
-            # Analyze content with AI
-            analysis = self.analyze_content_with_ai(text_content, file)
-            
-            # Process for RAG (if enabled)
-            rag_document_id = None
-            if analysis.get('extracted_text'):
-                rag_document_id = self._process_for_rag(
-                    analysis['extracted_text'], 
-                    file.filename, 
-                    user_id
-                )
-            
-            # Create result
-            result = {
-                'file_id': file_id,
-                'filename': file.filename,
-                'file_size': len(file.read()),
-                'file_hash': file_hash,
-                'mime_type': file.content_type,
-                'user_id': user_id,
-                'upload_timestamp': datetime.utcnow().isoformat(),
-                'processing_status': 'completed',
-                'analysis': analysis,
-                'rag_document_id': rag_document_id
-            }
+            result, text_content, file_meta = self._prepare_upload(file, user_id)
             
-            # Reset file pointer for potential future use
-            file.seek(0)
+            # AI analysis and RAG indexing don't affect the reply, so run them
+            # in the background; the upload stream is gone once the request ends
+            future = self.executor.submit(
+                self._analyze_and_index, text_content, file_meta, result['file_hash'], user_id
+            )
+            self._track_analysis(result['file_id'], future)
             
             return result
             
         except Exception as e:
             raise Exception(f"File processing failed: {str(e)}")
     
+    def process_files(self, files, user_id: str) -> List[Dict[str, Any]]:
+        """Process several uploaded files, analysing them with concurrent AI requests"""
+        try:
+            prepared = [self._prepare_upload(file, user_id) for file in files]
+            results = [result for result, _, _ in prepared]
+            
+            future = self.executor.submit(
+                self._analyze_and_index_many,
+                [text_content for _, text_content, _ in prepared],
+                [file_meta for _, _, file_meta in prepared],
+                [result['file_hash'] for result in results],
+                user_id
+            )
+            for index, result in enumerate(results):
+                self._track_analysis(result['file_id'], future, index)
+            
+            return results
+            
+        except Exception as e:
+            raise Exception(f"File processing failed: {str(e)}")
+    
+    def _prepare_upload(self, file, user_id: str) -> Tuple[Dict[str, Any], str, SimpleNamespace]:
+        """Validate, hash and extract an upload; returns its result, text and file metadata"""
+        # Validate file
+        is_valid, validation_message = self.validate_file(file)
+        if not is_valid:
+            raise Exception(validation_message)
+        
+        # Read the upload once; size, hash and text extraction share this buffer
+        file.seek(0)
+        data = file.read()
+        file.seek(0)
+        
+        # Generate file ID and metadata
+        file_id = uuid.uuid4().hex
+        file_hash = self._calculate_file_hash(data)
+        
+        # Extract text content
+        text_content = self.extract_text_from_file(data, file.content_type, file_hash)
+        
+        # Create result
+        result = {
+            'file_id': file_id,
+            'filename': file.filename,
+            'file_size': len(data),
+            'file_hash': file_hash,
+            'mime_type': file.content_type,
+            'user_id': user_id,
+            'upload_timestamp': datetime.utcnow().isoformat(),
+            'processing_status': 'processing'
+        }
+        file_meta = SimpleNamespace(filename=file.filename, content_type=file.content_type)
+        
+        return result, text_content, file_meta
+    
+    def _analyze_and_index(self, text_content: str, file_meta, file_hash: str, user_id: str) -> Dict[str, Any]:
+        """Run AI analysis and RAG indexing for an uploaded file"""
+        # Indexing needs only the text, so it runs on the RAG pool while the model analyses it
+        rag_future = self._start_rag_indexing(text_content, file_meta, user_id)
+        analysis = self.analyze_content_with_ai(text_content, file_meta, file_hash)
+        return self._index_analysis(analysis, rag_future)
+    
+    def _analyze_and_index_many(self, texts: List[str], files: List[Any], file_hashes: List[str],
+                                user_id: str) -> List[Dict[str, Any]]:
+        """Run concurrent AI analysis for several files while each is indexed for RAG"""
+        rag_futures = [self._start_rag_indexing(text_content, file_meta, user_id) for text_content, file_meta in zip(texts, files)]
+        analyses = self.analyze_many(texts, files, file_hashes)
+        return [self._index_analysis(analysis, rag_future) for analysis, rag_future in zip(analyses, rag_futures)]
+    
+    def _start_rag_indexing(self, text_content: str, file_meta, user_id: str) -> Optional[Future]:
+        """Queue a file's text for RAG indexing; None when there is nothing to index"""
+        if self.rag_service is None or not text_content.strip():
+            return None
+        metadata = {'title': file_meta.filename, 'type': self._get_document_type(file_meta.content_type)}
+        return self.rag_service.process_document_async(text_content, metadata, user_id)
+    
+    def _index_analysis(self, analysis: Dict[str, Any], rag_future: Optional[Future]) -> Dict[str, Any]:
+        """Wait for a file's RAG indexing and package the background result"""
+        rag_document_id = None
+        if rag_future is not None:
+            try:
+                rag_document_id = rag_future.result()
+            except Exception as e:
+                print(f"RAG processing failed: {e}")
+        
+        return {
+            'analysis': analysis,
+            'rag_document_id': rag_document_id
+        }
+    
+    def _track_analysis(self, file_id: str, future: Future, index: Optional[int] = None) -> None:
+        """Remember a pending analysis, forgetting the oldest once the limit is reached"""
+        # Batch futures resolve to a list; index picks this file's entry
+        with self._analysis_futures_lock:
+            self.analysis_futures[file_id] = (future, index)
+            if len(self.analysis_futures) > self.analysis_futures_size:
+                self.analysis_futures.popitem(last=False)
+    
+    def get_analysis(self, file_id: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Wait for a file's background analysis; None if the file ID is unknown"""
+        with self._analysis_futures_lock:
+            tracked = self.analysis_futures.get(file_id)
+        if tracked is None:
+            return None
+        
+        # Raises concurrent.futures.TimeoutError if still running after timeout
+        future, index = tracked
+        result = future.result(timeout=timeout)
+        if index is not None:
+            result = result[index]
+        return {
+            'file_id': file_id,
+            'processing_status': 'completed',
+            **result
+        }
+    
     def validate_file(self, file) -> Tuple[bool, str]:
         """Validate uploaded file for security and format compliance"""
         
@@ -107,188 +303,366 @@ class FileProcessingService:
         
         # Check if file type is supported
         content_type = file.content_type
-        if content_type not in self.supported_document_types and content_type not in self.supported_audio_types:
+        if content_type not in self.supported_types:
             return False, f"Unsupported file type: {content_type}"
         
         # Basic security checks
-        dangerous_extensions = ['.exe', '.bat', '.cmd', '.scr', '.pif', '.com', '.vbs', '.js']
         file_ext = os.path.splitext(file.filename.lower())[1]
-        if file_ext in dangerous_extensions:
+        if file_ext in self.DANGEROUS_EXTENSIONS:
             return False, "Potentially dangerous file type detected"
         
         return True, "File validation passed"
     
-    def extract_text_from_file(self, file) -> str:
+    def extract_text_from_file(self, data: bytes, content_type: str, file_hash: Optional[str] = None) -> str:
         """Extract text content from various file types"""
         try:
-            content_type = file.content_type
-            
             if content_type in self.supported_document_types:
-                return self._extract_from_document(file, content_type)
+                return self._extract_from_document(data, content_type)
             elif content_type in self.supported_audio_types:
-                return self._extract_from_audio(file)
+                return self._extract_from_audio(data, file_hash)
             else:
                 raise Exception(f"Unsupported file type: {content_type}")
                 
         except Exception as e:
             raise Exception(f"Text extraction failed: {str(e)}")
     
-    def _extract_from_document(self, file, content_type: str) -> str:
+    def _extract_from_document(self, data: bytes, content_type: str) -> str:
         """Extract text from document files"""
         try:
             if content_type == 'application/pdf':
-                return self._extract_from_pdf(file)
+                return self._extract_from_pdf(data)
             elif content_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
-                return self._extract_from_docx(file)
+                return self._extract_from_docx(data)
             elif content_type in ['text/plain', 'text/markdown', 'text/csv']:
-                return self._extract_from_text(file)
+                return self._extract_from_text(data)
             else:
                 raise Exception(f"Unsupported document type: {content_type}")
                 
         except Exception as e:
             raise Exception(f"Document extraction failed: {str(e)}")
     
-    def _extract_from_pdf(self, file) -> str:
+    def _extract_from_pdf(self, data: bytes) -> str:
         """Extract text content from PDF file"""
         try:
-            pdf_file = io.BytesIO(file.read())
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
+            pdf = pdfium.PdfDocument(data)
+            try:
+                page_count = len(pdf)
+                if page_count < PDF_PARALLEL_MIN_PAGES or PDF_MAX_WORKERS < 2:
+                    return "\n".join(_extract_pdf_page_text(page) for page in pdf).strip()
+            finally:
+                pdf.close()
             
-            text_content = ""
-            for page in pdf_reader.pages:
-                text_content += page.extract_text() + "\n"
+            # PDFium is not thread-safe, so split contiguous page ranges
+            # across processes, each with its own document handle. Workers
+            # open a shared temp file instead of each receiving a pickled copy.
+            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_file:
+                temp_file.write(data)
+                temp_path = temp_file.name
+            
+            try:
+                step = -(-page_count // PDF_MAX_WORKERS)
+                executor = _get_pdf_executor()
+                futures = [
+                    executor.submit(_extract_pdf_page_range, temp_path, start, min(start + step, page_count))
+                    for start in range(0, page_count, step)
+                ]
+                texts = [text for future in futures for text in future.result()]
+            finally:
+                # Clean up temporary file
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
             
-            return text_content.strip()
+            return "\n".join(texts).strip()
             
         except Exception as e:
             raise Exception(f"Failed to extract text from PDF: {str(e)}")
     
-    def _extract_from_docx(self, file) -> str:
+    def _extract_from_docx(self, data: bytes) -> str:
         """Extract text content from DOCX file"""
         try:
-            docx_file = io.BytesIO(file.read())
+            docx_file = io.BytesIO(data)
             doc = Document(docx_file)
             
-            text_content = ""
+            parts = []
             for paragraph in doc.paragraphs:
-                text_content += paragraph.text + "\n"
+                parts.append(paragraph.text)
+                parts.append("\n")
             
             # Also extract text from tables
             for table in doc.tables:
                 for row in table.rows:
                     for cell in row.cells:
-                        text_content += cell.text + "\t"
-                    text_content += "\n"
+                        parts.append(cell.text)
+                        parts.append("\t")
+                    parts.append("\n")
             
-            return text_content.strip()
+            return "".join(parts).strip()
             
         except Exception as e:
             raise Exception(f"Failed to extract text from DOCX: {str(e)}")
     
-    def _extract_from_text(self, file) -> str:
+    def _extract_from_text(self, data: bytes) -> str:
         """Extract text content from plain text files"""
         try:
-            # Try UTF-8 first, then fallback to other encodings
-            encodings = ['utf-8', 'utf-16', 'latin-1', 'cp1252']
+            # A byte-order mark identifies the encoding without any trial decoding
+            if data.startswith(codecs.BOM_UTF8):
+                return data[len(codecs.BOM_UTF8):].decode('utf-8')
+            if data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+                return data.decode('utf-16')
             
-            for encoding in encodings:
-                try:
-                    file.seek(0)
-                    return file.read().decode(encoding)
-                except UnicodeDecodeError:
-                    continue
+            # Most uploads are UTF-8; sniff the encoding only when that fails
+            try:
+                return data.decode('utf-8')
+            except UnicodeDecodeError:
+                pass
             
-            raise Exception("Unable to decode text file with supported encodings")
+            best_match = charset_normalizer.from_bytes(data).best()
+            return str(best_match) if best_match else data.decode('latin-1')
             
         except Exception as e:
             raise Exception(f"Failed to extract text from file: {str(e)}")
     
-    def _extract_from_audio(self, file) -> str:
+    def _extract_from_audio(self, data: bytes, file_hash: Optional[str] = None) -> str:
         """Extract text from audio files using Whisper"""
         try:
             if not self.whisper_model:
                 raise Exception("Whisper model not initialized")
             
-            # Save audio to temporary file
-            temp_path = f"/tmp/audio_{uuid.uuid4()}.wav"
-            file.save(temp_path)
+            cached_transcription = self._get_cached(self.transcription_cache, file_hash)
+            if cached_transcription is not None:
+                return cached_transcription
+            
+            # Decode straight from the upload buffer; no temporary file needed
+            transcription = self._run_whisper(io.BytesIO(data))
+            self._store_cached(self.transcription_cache, file_hash, transcription, self.transcription_cache_size)
+            return transcription
             
-            try:
-                # Transcribe audio
-                result = self.whisper_model.transcribe(temp_path)
-                transcription = result["text"]
-                
-                return transcription.strip()
-                
-            finally:
-                # Clean up temporary file
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-                    
         except Exception as e:
             raise Exception(f"Audio transcription failed: {str(e)}")
     
-    def analyze_content_with_ai(self, text_content: str, file) -> Dict[str, Any]:
+    def _run_whisper(self, audio) -> str:
+        """Transcribe a path, binary stream or 16 kHz float32 array and join the segments"""
+        segments, _ = self.whisper_model.transcribe(audio, batch_size=16, vad_filter=True)
+        return "".join(segment.text for segment in segments).strip()
+    
+    def read_pcm16_stream(self, stream, chunk_bytes: int = 8192) -> Iterator[np.ndarray]:
+        """Read 16-bit little-endian PCM from a binary stream as float32 sample chunks"""
+        leftover = b''
+        while True:
+            data = stream.read(chunk_bytes)
+            if not data:
+                break
+            data = leftover + data
+            usable = len(data) - len(data) % 2
+            leftover = data[usable:]
+            if usable:
+                yield np.frombuffer(data[:usable], dtype='<i2').astype(np.float32) / 32768.0
+    
+    def stream_transcribe(self, audio_iter: Iterable[np.ndarray]) -> Iterator[str]:
+        """Transcribe a stream of 16 kHz float32 chunks, yielding words as soon as they are stable"""
+        if not self.whisper_model:
+            raise Exception("Whisper model not initialized")
+        
+        return self._local_agreement(audio_iter)
+    
+    def _local_agreement(self, audio_iter: Iterable[np.ndarray]) -> Iterator[str]:
+        """LocalAgreement-2: emit the words two consecutive decoding rounds agree on"""
+        buffer = np.zeros(0, dtype=np.float32)
+        buffer_start = 0.0  # Stream time of buffer[0], in seconds
+        new_chunks = []
+        new_samples = 0
+        committed = []  # Agreed words, fed back as the prompt
+        committed_end = 0.0
+        previous = []  # Unconfirmed (start, end, word) from the last round
+        
+        for chunk in audio_iter:
+            new_chunks.append(chunk)
+            new_samples += len(chunk)
+            if new_samples < STREAM_SAMPLE_RATE * STREAM_ROUND_SECONDS:
+                continue
+            
+            buffer = np.concatenate([buffer, *new_chunks])
+            new_chunks = []
+            new_samples = 0
+            
+            current = self._transcribe_words(buffer, buffer_start, committed, committed_end)
+            
+            agreed = 0
+            while (agreed < len(previous) and agreed < len(current)
+                   and previous[agreed][2].strip().lower() == current[agreed][2].strip().lower()):
+                agreed += 1
+            
+            # Whisper can't see past 30 s, so commit whatever the buffer holds
+            if len(buffer) >= STREAM_SAMPLE_RATE * STREAM_MAX_BUFFER_SECONDS:
+                agreed = len(current)
+            
+            for _, end, word in current[:agreed]:
+                committed.append(word)
+                committed_end = end
+                yield word
+            previous = current[agreed:]
+            
+            # Drop audio behind the last agreed word so later rounds skip it
+            buffer_seconds = len(buffer) / STREAM_SAMPLE_RATE
+            if buffer_seconds >= STREAM_MAX_BUFFER_SECONDS and not current:
+                cut = len(buffer)
+            elif buffer_seconds >= STREAM_TRIM_SECONDS and committed_end > buffer_start:
+                cut = int((committed_end - buffer_start) * STREAM_SAMPLE_RATE)
+            else:
+                cut = 0
+            if cut:
+                buffer = buffer[cut:]
+                buffer_start += cut / STREAM_SAMPLE_RATE
+        
+        # End of stream: the last round's words have nothing left to agree with
+        if new_chunks:
+            buffer = np.concatenate([buffer, *new_chunks])
+        if len(buffer):
+            for _, _, word in self._transcribe_words(buffer, buffer_start, committed, committed_end):
+                yield word
+    
+    def _transcribe_words(self, buffer: np.ndarray, buffer_start: float, committed: List[str],
+                          committed_end: float) -> List[Tuple[float, float, str]]:
+        """Decode the buffer once and return the words that follow the committed text"""
+        # Single-window decode, so call the underlying model rather than the batched pipeline
+        segments, _ = self.whisper_model.model.transcribe(
+            buffer,
+            word_timestamps=True,
+            condition_on_previous_text=False,
+            initial_prompt="".join(committed[-50:]) or None,
+            vad_filter=False
+        )
+        
+        words = []
+        for segment in segments:
+            for word in segment.words or []:
+                start = buffer_start + word.start
+                if start >= committed_end - 0.1:
+                    words.append((start, buffer_start + word.end, word.word))
+        return words
+    
+    def analyze_content_with_ai(self, text_content: str, file, file_hash: Optional[str] = None) -> Dict[str, Any]:
         """Analyze content using OpenAI GPT models"""
         try:
-            # Prepare content for analysis (limit to avoid token limits)
-            analysis_text = text_content[:4000] if len(text_content) > 4000 else text_content
+            cache_key = (file_hash, self.analysis_model) if file_hash else None
+            cached_analysis = self._get_cached(self.analysis_cache, cache_key)
+            if cached_analysis is not None:
+                return self._add_analysis_metadata(cached_analysis, text_content, file)
             
-            # Create analysis prompt
-            prompt = f"""Analyze the following document content and provide comprehensive insights:
-
-Document: {file.filename}
-Type: {file.content_type}
-Content Length: {len(text_content)} characters
-Content Preview: {analysis_text[:1000]}...
-
-Please provide:
-1. A concise summary (2-3 sentences)
-2. Key points and insights (5-7 bullet points)
-3. Document category and tags
-4. Estimated reading time
-5. Content quality assessment
-6. Suggested actions or follow-ups
-
-Format as JSON with keys: summary, key_points, category, tags, reading_time_minutes, quality_score, suggested_actions"""
-
             # Get AI analysis
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are an expert document analyst. Provide insightful analysis of documents."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=500,
-                temperature=0.3
-            )
-            
-            ai_response = response.choices[0].message.content
+            response = self.client.chat.completions.create(**self._analysis_request(text_content, file))
             
-            # Try to parse AI response
-            try:
-                analysis_data = json.loads(ai_response)
-            except:
-                # If parsing fails, create fallback analysis
-                analysis_data = self._create_fallback_analysis(text_content, file)
-            
-            # Add extracted text and metadata
-            analysis_data['extracted_text'] = text_content
-            analysis_data['document_type'] = self._get_document_type(file.content_type)
-            analysis_data['word_count'] = len(text_content.split())
-            analysis_data['sentence_count'] = len(text_content.split('.'))
-            analysis_data['paragraph_count'] = len(text_content.split('\n\n'))
-            analysis_data['content_length'] = len(text_content)
-            analysis_data['ai_model_used'] = 'gpt-3.5-turbo'
-            analysis_data['analysis_timestamp'] = datetime.utcnow().isoformat()
-            
-            return analysis_data
+            return self._parse_analysis(response.choices[0].message.content, text_content, file, cache_key)
             
         except Exception as e:
             print(f"AI analysis failed: {e}")
             # Return fallback analysis
             return self._create_fallback_analysis(text_content, file)
     
+    def analyze_many(self, texts: List[str], files: List[Any],
+                     file_hashes: Optional[List[Optional[str]]] = None) -> List[Dict[str, Any]]:
+        """Analyze several documents with concurrent OpenAI requests"""
+        file_hashes = file_hashes or [None] * len(texts)
+        return asyncio.run(self._analyze_many_async(texts, files, file_hashes))
+    
+    async def _analyze_many_async(self, texts: List[str], files: List[Any],
+                                  file_hashes: List[Optional[str]]) -> List[Dict[str, Any]]:
+        """Gather one analysis request per document"""
+        # A client per event loop; its connections can't be reused across loops
+        client = AsyncOpenAI()
+        try:
+            return await asyncio.gather(*(
+                self._analyze_content_async(client, text_content, file, file_hash)
+                for text_content, file, file_hash in zip(texts, files, file_hashes)
+            ))
+        finally:
+            await client.close()
+    
+    async def _analyze_content_async(self, client: AsyncOpenAI, text_content: str, file,
+                                     file_hash: Optional[str] = None) -> Dict[str, Any]:
+        """Analyze content using OpenAI GPT models without blocking the event loop"""
+        try:
+            cache_key = (file_hash, self.analysis_model) if file_hash else None
+            cached_analysis = self._get_cached(self.analysis_cache, cache_key)
+            if cached_analysis is not None:
+                return self._add_analysis_metadata(cached_analysis, text_content, file)
+            
+            response = await client.chat.completions.create(**self._analysis_request(text_content, file))
+            
+            return self._parse_analysis(response.choices[0].message.content, text_content, file, cache_key)
+            
+        except Exception as e:
+            print(f"AI analysis failed: {e}")
+            return self._create_fallback_analysis(text_content, file)
+    
+    def _analysis_request(self, text_content: str, file) -> Dict[str, Any]:
+        """Build the chat completion arguments for a document analysis"""
+        # Only the document facts and a content preview vary per call
+        prompt = f"""Document: {file.filename}
+Type: {file.content_type}
+Length: {len(text_content)} characters
+
+{text_content[:1000]}"""
+        
+        # JSON mode guarantees a parseable object
+        return {
+            'model': self.analysis_model,
+            'messages': [
+                {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            'response_format': {"type": "json_object"},
+            'max_tokens': 500,
+            'temperature': 0.3
+        }
+    
+    def _parse_analysis(self, ai_response: str, text_content: str, file,
+                        cache_key: Optional[Tuple[str, str]]) -> Dict[str, Any]:
+        """Parse and cache the model's JSON reply, falling back to a basic analysis"""
+        # Parsing can still fail if the reply is cut off at max_tokens
+        try:
+            analysis_data = json.loads(ai_response)
+            self._store_cached(self.analysis_cache, cache_key, analysis_data, self.analysis_cache_size)
+        except:
+            # If parsing fails, create fallback analysis
+            analysis_data = self._create_fallback_analysis(text_content, file)
+        
+        return self._add_analysis_metadata(analysis_data, text_content, file)
+    
+    def _add_analysis_metadata(self, ai_analysis: Dict[str, Any], text_content: str, file) -> Dict[str, Any]:
+        """Combine AI analysis fields with extracted text and content metadata"""
+        analysis_data = dict(ai_analysis)
+        analysis_data['extracted_text'] = text_content
+        analysis_data['document_type'] = self._get_document_type(file.content_type)
+        analysis_data['word_count'] = len(text_content.split())
+        # n separators make n + 1 pieces, counted without building the list
+        analysis_data['sentence_count'] = text_content.count('.') + 1
+        analysis_data['paragraph_count'] = text_content.count('\n\n') + 1
+        analysis_data['content_length'] = len(text_content)
+        analysis_data['ai_model_used'] = self.analysis_model
+        analysis_data['analysis_timestamp'] = datetime.utcnow().isoformat()
+        return analysis_data
+    
+    def _get_cached(self, cache: OrderedDict, cache_key) -> Optional[Any]:
+        """Return a cached value, marking the entry as recently used"""
+        if cache_key is None:
+            return None
+        with self._cache_lock:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                cache.move_to_end(cache_key)
+            return cached
+    
+    def _store_cached(self, cache: OrderedDict, cache_key, value: Any, max_size: int) -> None:
+        """Cache a value, evicting the least recently used entry when full"""
+        if cache_key is None:
+            return
+        with self._cache_lock:
+            cache[cache_key] = value
+            cache.move_to_end(cache_key)
+            if len(cache) > max_size:
+                cache.popitem(last=False)
+    
     def _create_fallback_analysis(self, text_content: str, file) -> Dict[str, Any]:
         """Create fallback analysis when AI fails"""
         word_count = len(text_content.split())
@@ -317,50 +691,24 @@ Format as JSON with keys: summary, key_points, category, tags, reading_time_minu
         else:
             return 'UNKNOWN'
     
-    def _calculate_file_hash(self, file) -> str:
+    def _calculate_file_hash(self, data: bytes) -> str:
         """Calculate SHA-256 hash of file content"""
         try:
-            file.seek(0)
-            file_content = file.read()
-            file_hash = hashlib.sha256(file_content).hexdigest()
-            file.seek(0)  # Reset file pointer
-            return file_hash
+            return hashlib.sha256(data).hexdigest()
         except Exception as e:
             print(f"Failed to calculate file hash: {e}")
             return "unknown"
     
-    def _process_for_rag(self, text_content: str, filename: str, user_id: str) -> Optional[str]:
-        """Process document for RAG (Retrieval-Augmented Generation)"""
-        try:
-            # This would integrate with the RAG service
-            # For now, return a placeholder
-            return f"rag_doc_{uuid.uuid4()}"
-        except Exception as e:
-            print(f"RAG processing failed: {e}")
-            return None
-    
     def transcribe_audio(self, audio_file, user_id: str) -> str:
         """Transcribe audio file using Whisper"""
         try:
             if not self.whisper_model:
                 raise Exception("Whisper model not initialized")
             
-            # Save audio to temporary file
-            temp_path = f"/tmp/audio_{uuid.uuid4()}.wav"
-            audio_file.save(temp_path)
+            # Decode straight from the upload stream; no temporary file needed
+            audio_file.seek(0)
+            return self._run_whisper(audio_file.stream)
             
-            try:
-                # Transcribe audio
-                result = self.whisper_model.transcribe(temp_path)
-                transcription = result["text"]
-                
-                return transcription.strip()
-                
-            finally:
-                # Clean up temporary file
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-                    
         except Exception as e:
             raise Exception(f"Audio transcription failed: {str(e)}")
     
@@ -1,18 +1,309 @@
 import os
+import asyncio
+import atexit
+import copy
 import json
+import logging
 import re
+import tempfile
 import uuid
+import threading
+import time
+from collections import Counter, OrderedDict
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import List, Dict, Any, Optional, Tuple
+import httpx
 import openai
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from dateutil import parser
 import pytz
+import faiss
+import numpy as np
+import orjson
+from services.rag_service import _get_embedding_model
+
+# Compiled once at import; these run on every rule-based parse and signature.
+# Time expressions are one alternation scanned in a single pass; at any position
+# the first alternative wins, so the more specific forms come first.
+_TIME_RE = re.compile(r'\b(?:' + '|'.join((
+    r'(?:in|at)\s+\d{1,2}\s*(?:am|pm)',
+    r'(?:next|last)\s+(?:week|month|year|monday|tuesday|wednesday|thursday|friday|saturday|sunday)',
+    r'\d{1,2}\s*o\'?clock',
+    r'\d{1,2}(?::?\d{2})?(?:\s*(?:am|pm))?',
+    r'(?:today|tomorrow|yesterday)',
+    r'(?:morning|afternoon|evening|night)'
+)) + r')\b', re.IGNORECASE)
+
+# Trigger words, matched as whole words so "reschedule" is not read as "schedule",
+# and which action wins when several appear
+_ACTION_KEYWORDS = {
+    'create': 'create', 'add': 'create', 'schedule': 'create', 'book': 'create',
+    'update': 'update', 'change': 'update', 'modify': 'update', 'reschedule': 'update', 'move': 'update',
+    'delete': 'delete', 'remove': 'delete', 'cancel': 'delete',
+    'find': 'read', 'search': 'read', 'show': 'read'
+}
+_ACTION_PRIORITY = ('create', 'update', 'delete', 'read')
+_ACTION_RE = re.compile(r'\b(?:' + '|'.join(map(re.escape, _ACTION_KEYWORDS)) + r')\b')
+
+# The rules can't tell what a negation applies to, so a negated command always goes to the model
+_NEGATION_RE = re.compile(r"\b(?:not|no|never|cannot|(?:don|doesn|won|can|shouldn)['\u2019]?t)\b")
+
+# Weekday numbers match datetime.weekday(); day parts map to a default start hour
+_WEEKDAYS = {name: index for index, name in enumerate(
+    ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+)}
+_DAYPART_HOURS = {'morning': 9, 'afternoon': 14, 'evening': 18, 'night': 20}
+_NEXT_WEEKDAY_RE = re.compile(r'next\s+(' + '|'.join(_WEEKDAYS) + r')')
+_DAYPART_RE = re.compile('|'.join(_DAYPART_HOURS))
+
+# The title stops before a trailing time, place or target, so "meeting with Sam
+# tomorrow at 3pm" and "move my meeting with Sam to Friday" both give "Sam"
+_TITLE_RE = re.compile(
+    r'(?:meeting|call|appointment)\s+with\s+([^,\.]+?)'
+    r'(?=\s+(?:at|in|on|for|from|to|today|tonight|tomorrow|next|this)\b|[,\.]|$)',
+    re.IGNORECASE
+)
+_LOCATION_RE = re.compile(r'(?:at|in|location)\s+([^,\.]+)', re.IGNORECASE)
+_DURATION_RE = re.compile(r'(\d+)\s*(hour|hr|minute|min)s?', re.IGNORECASE)
+
+# Rule-parse confidence is the sum of the features found; a command with an
+# unambiguous action, a time and a title scores 1.0 and skips the model
+_RULE_FEATURE_WEIGHTS = {'action': 0.35, 'time': 0.35, 'title': 0.3}
+
+class _JSONLogFormatter(logging.Formatter):
+    """Format a record and its MCP payload as one JSON line; runs only for emitted records"""
+    
+    def format(self, record):
+        return orjson.dumps({
+            'timestamp': datetime.utcfromtimestamp(record.created).isoformat(),
+            'level': record.levelname,
+            'message': record.getMessage(),
+            'mcp': getattr(record, 'mcp', None)
+        }, default=str).decode('utf-8')
+
+# Command logs are INFO; at the default WARNING level they are dropped before any serialisation
+logger = logging.getLogger('mcp.calendar')
+if not logger.handlers:
+    _log_handler = logging.StreamHandler()
+    _log_handler.setFormatter(_JSONLogFormatter())
+    logger.addHandler(_log_handler)
+    logger.setLevel(os.getenv('MCP_LOG_LEVEL', 'WARNING').upper())
+    logger.propagate = False
+
+_openai_client = None
+
+def _get_openai_client() -> OpenAI:
+    """Return the process-wide OpenAI client, creating it on first use"""
+    global _openai_client
+    if _openai_client is None:
+        # One keep-alive pool for every service instance; fail fast instead of
+        # the SDK's 10-minute default when the API stalls
+        _openai_client = OpenAI(http_client=httpx.Client(
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+            timeout=httpx.Timeout(8.0, connect=2.0)
+        ))
+    return _openai_client
+
+def _parse_datetime(value: str) -> datetime:
+    """Parse a timestamp with the strict ISO 8601 parser, falling back to dateutil for free-form text"""
+    # Timestamps written by isoformat() round-trip through fromisoformat far faster
+    # than dateutil; it rejects 'Z' before Python 3.11, which dateutil then handles
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return parser.parse(value)
+
+# Kept byte-identical across requests, ahead of the command, so the provider can reuse its prompt prefix
+INTENT_SYSTEM_PROMPT = (
+    "You are a calendar intent parser. Extract the intent of the user's command; "
+    "finding events is 'read', scheduling is 'create'."
+)
+
+# Structured-output schema for intent parsing; strict mode makes every key required,
+# so optional details are nullable instead of absent
+_NULLABLE_STRING = {"type": ["string", "null"]}
+CALENDAR_INTENT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "action": {"type": "string", "enum": ["create", "read", "update", "delete"]},
+        "event_details": {
+            "type": "object",
+            "properties": {
+                "title": _NULLABLE_STRING,
+                "description": _NULLABLE_STRING,
+                "start_time": _NULLABLE_STRING,
+                "end_time": _NULLABLE_STRING,
+                "location": _NULLABLE_STRING,
+                "attendees": {"type": "array", "items": {"type": "string"}}
+            },
+            "required": ["title", "description", "start_time", "end_time", "location", "attendees"],
+            "additionalProperties": False
+        },
+        "time_expressions": {"type": "array", "items": {"type": "string"}},
+        "priority": {"type": "string", "enum": ["low", "medium", "high"]},
+        "event_type": {"type": "string", "enum": ["meeting", "reminder", "task", "event"]},
+        "confidence": {"type": "number"}
+    },
+    "required": ["action", "event_details", "time_expressions", "priority", "event_type", "confidence"],
+    "additionalProperties": False
+}
+
+class _SemanticIntentCache:
+    """Embeddings of parsed commands and their intents, shared by every service instance in a process"""
+    
+    def __init__(self, path: str, threshold: float = 0.95, max_entries: int = 10000, persist_interval: float = 30.0):
+        # Near-duplicate commands reuse an earlier intent when embeddings are this close
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.persist_interval = persist_interval
+        self.embedding_model = None
+        self.index = None
+        self.entries = []
+        self.dirty = False
+        self.lock = threading.Lock()
+        self.load()
+        
+        # New entries are written out in the background every interval and at exit,
+        # never on the request path
+        threading.Thread(target=self._persist_loop, name='intent-cache-writer', daemon=True).start()
+        atexit.register(self.persist)
+    
+    def load(self) -> None:
+        """Load the embedding model and the persisted intent index"""
+        try:
+            # The same instance RAG uses: one copy of the weights per process, with its device and thread settings
+            self.embedding_model = _get_embedding_model(os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2'))
+            dimension = self.embedding_model.get_sentence_embedding_dimension()
+            
+            # Index and entries share one file, so a reader never pairs one worker's
+            # index with another's entries
+            cache_file = os.path.join(self.path, 'intents.npz')
+            if os.path.exists(cache_file):
+                with np.load(cache_file) as data:
+                    self.index = faiss.deserialize_index(data['index'])
+                    self.entries = json.loads(data['entries'].item())
+                
+                if self.index.ntotal != len(self.entries) or self.index.d != dimension:
+                    self.index = None
+                    self.entries = []
+            
+            if self.index is None:
+                # Inner product over normalised embeddings is cosine similarity
+                self.index = faiss.IndexFlatIP(dimension)
+                
+        except Exception as e:
+            print(f"Failed to initialize semantic intent cache: {e}")
+            self.embedding_model = None
+            self.index = None
+            self.entries = []
+    
+    def find(self, embedding: Optional[np.ndarray], signature: str) -> Optional[Dict[str, Any]]:
+        """Return the intent of the closest earlier command if it is similar enough and has the same signature"""
+        if embedding is None or self.index is None:
+            return None
+        with self.lock:
+            if self.index.ntotal == 0:
+                return None
+            scores, ids = self.index.search(embedding, 1)
+            if scores[0][0] < self.threshold:
+                return None
+            entry = self.entries[ids[0][0]]
+        
+        return entry['intent'] if entry['signature'] == signature else None
+    
+    def add(self, embedding: Optional[np.ndarray], signature: str, intent: Dict[str, Any]) -> None:
+        """Add a parsed command, marking the cache for the background writer"""
+        if embedding is None or self.index is None:
+            return
+        try:
+            with self.lock:
+                if self.index.ntotal >= self.max_entries:
+                    return
+                self.index.add(embedding)
+                self.entries.append({'signature': signature, 'intent': intent})
+                self.dirty = True
+        except Exception as e:
+            print(f"Failed to update semantic intent cache: {e}")
+    
+    def _persist_loop(self) -> None:
+        """Write the cache out every persist interval while it has unsaved entries"""
+        while True:
+            time.sleep(self.persist_interval)
+            self.persist()
+    
+    def persist(self) -> None:
+        """Save the cache if it changed, replacing the file atomically so restarts stay warm"""
+        # Snapshot under the lock, then write without holding it
+        with self.lock:
+            if not self.dirty or self.index is None:
+                return
+            index_bytes = faiss.serialize_index(self.index)
+            entries_json = json.dumps(self.entries)
+            self.dirty = False
+        
+        temp_path = None
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            # Other workers may save the same cache; each writes a private temp file and
+            # os.replace swaps it in whole, so readers never see a partial file
+            fd, temp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, index=index_bytes, entries=np.array(entries_json))
+            os.replace(temp_path, os.path.join(self.path, 'intents.npz'))
+        except Exception as e:
+            print(f"Failed to persist semantic intent cache: {e}")
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+            with self.lock:
+                self.dirty = True
+
+_semantic_cache = None
+_semantic_cache_lock = threading.Lock()
+
+def _get_semantic_cache() -> _SemanticIntentCache:
+    """Return the process-wide semantic intent cache, loading it on first use"""
+    global _semantic_cache
+    with _semantic_cache_lock:
+        if _semantic_cache is None:
+            # One index, one writer thread and one exit hook however many services are built
+            _semantic_cache = _SemanticIntentCache(
+                os.path.join(os.path.dirname(__file__), '..', 'database', 'intent_cache')
+            )
+    return _semantic_cache
+
+@lru_cache(maxsize=8192)
+def _parse_event_time(value: str) -> datetime:
+    """Parse an event timestamp once per distinct string; datetimes are immutable, so hits are shared"""
+    return _parse_datetime(value)
 
 class MCPCalendarService:
     def __init__(self):
-        self.client = OpenAI()
+        self.client = _get_openai_client()
         self.timezone = pytz.UTC  # Default to UTC, can be configured per user
+        self.intent_model = "gpt-4o-mini"
+        
+        # Parsed intents keyed by normalised command text
+        self.intent_cache = OrderedDict()
+        self.intent_cache_size = 4096
+        
+        # Near-duplicate commands reuse an earlier intent; the index is shared by every instance
+        self.semantic_cache = _get_semantic_cache()
+        self.embedding_model = self.semantic_cache.embedding_model
+        self._intent_cache_lock = threading.Lock()
+        
+        # Rule-based intents at or above this confidence are used without asking the model
+        self.rule_confidence_threshold = 0.85
+        # How each intent was resolved (rules, exact, semantic, model), for tuning the threshold
+        self.intent_sources = Counter()
+        
+        # Date ranges known to hold no events; a user's entries stop matching once
+        # their calendar version is bumped by a write, then age out of the LRU
+        self.empty_ranges = OrderedDict()
+        self.empty_ranges_size = 10000
+        self.calendar_versions = Counter()
+        self._empty_ranges_lock = threading.Lock()
         
     def process_natural_language(self, user_id: str, command: str) -> Dict[str, Any]:
         """Process natural language calendar commands using MCP principles"""
@@ -40,61 +331,249 @@ class MCPCalendarService:
                 'command': command
             }
     
+    def process_natural_language_batch(self, commands: List[Tuple[str, str]],
+                                       poll_interval: float = 30.0) -> List[Dict[str, Any]]:
+        """Process many (user_id, command) pairs, parsing uncached intents through the OpenAI Batch API"""
+        # Batch jobs finish within hours at half the token price, so this suits
+        # scheduled reprocessing; interactive commands stay on the sync path
+        lookups = [self._lookup_intent(command) for _, command in commands]
+        intents = [lookup[0] for lookup in lookups]
+        pending = [i for i, intent in enumerate(intents) if intent is None]
+        
+        if pending:
+            try:
+                replies = self._run_intent_batch([commands[i][1] for i in pending], poll_interval)
+            except Exception as e:
+                print(f"Intent batch failed: {e}")
+                replies = {}
+            
+            for position, i in enumerate(pending):
+                _, cache_key, embedding, signature = lookups[i]
+                command = commands[i][1]
+                ai_response = replies.get(position)
+                if ai_response is None:
+                    intents[i] = self._rule_based_parsing(command)
+                else:
+                    intents[i] = self._parse_intent_response(ai_response, command, cache_key, embedding, signature)
+        
+        return self._execute_parsed_commands(commands, intents)
+    
+    def process_many(self, commands: List[Tuple[str, str]], max_concurrency: int = 16) -> List[Dict[str, Any]]:
+        """Process many (user_id, command) pairs, parsing intents with concurrent OpenAI requests"""
+        intents = asyncio.run(self._parse_many_async([command for _, command in commands], max_concurrency))
+        return self._execute_parsed_commands(commands, intents)
+    
+    async def _parse_many_async(self, commands: List[str], max_concurrency: int) -> List[Dict[str, Any]]:
+        """Gather intent parses, with at most max_concurrency requests in flight"""
+        semaphore = asyncio.Semaphore(max_concurrency)
+        # A client per event loop; its connections can't be reused across loops
+        client = AsyncOpenAI(http_client=httpx.AsyncClient(timeout=httpx.Timeout(8.0, connect=2.0)))
+        try:
+            return await asyncio.gather(*(
+                self._parse_calendar_intent_async(client, semaphore, command) for command in commands
+            ))
+        finally:
+            await client.close()
+    
+    async def _parse_calendar_intent_async(self, client: AsyncOpenAI, semaphore: asyncio.Semaphore,
+                                           command: str) -> Dict[str, Any]:
+        """Parse one command into structured intent without blocking the event loop"""
+        cached_intent, cache_key, embedding, signature = self._lookup_intent(command)
+        if cached_intent is not None:
+            return cached_intent
+        
+        try:
+            async with semaphore:
+                response = await client.chat.completions.create(**self._intent_request(command))
+            
+            ai_response = response.choices[0].message.content
+            
+            return self._parse_intent_response(ai_response, command, cache_key, embedding, signature)
+            
+        except Exception as e:
+            # Fallback to rule-based parsing
+            return self._rule_based_parsing(command)
+    
+    def _execute_parsed_commands(self, commands: List[Tuple[str, str]],
+                                 intents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Execute and log parsed commands, returning results shaped like process_natural_language"""
+        results = []
+        for (user_id, command), parsed_intent in zip(commands, intents):
+            try:
+                result = self._execute_calendar_command(user_id, parsed_intent)
+                self._log_mcp_command(user_id, command, parsed_intent, result)
+                results.append({
+                    'success': True,
+                    'intent': parsed_intent,
+                    'result': result,
+                    'command': command
+                })
+            except Exception as e:
+                results.append({
+                    'success': False,
+                    'error': str(e),
+                    'command': command
+                })
+        
+        return results
+    
+    def _run_intent_batch(self, commands: List[str], poll_interval: float) -> Dict[int, str]:
+        """Submit one Batch API job for the commands and wait for it; returns replies by position"""
+        lines = [
+            json.dumps({
+                'custom_id': str(position),
+                'method': 'POST',
+                'url': '/v1/chat/completions',
+                'body': self._intent_request(command)
+            })
+            for position, command in enumerate(commands)
+        ]
+        batch_input = self.client.files.create(
+            file=('calendar_intents.jsonl', "\n".join(lines).encode('utf-8')),
+            purpose='batch'
+        )
+        batch = self.client.batches.create(
+            input_file_id=batch_input.id,
+            endpoint='/v1/chat/completions',
+            completion_window='24h'
+        )
+        
+        while batch.status not in ('completed', 'failed', 'expired', 'cancelled'):
+            time.sleep(poll_interval)
+            batch = self.client.batches.retrieve(batch.id)
+        
+        # Expired batches still return the requests that finished
+        replies = {}
+        if batch.output_file_id:
+            output = self.client.files.content(batch.output_file_id).text
+            for line in output.splitlines():
+                record = json.loads(line)
+                response = record.get('response') or {}
+                if response.get('status_code') == 200:
+                    replies[int(record['custom_id'])] = response['body']['choices'][0]['message']['content']
+        
+        return replies
+    
     def _parse_calendar_intent(self, command: str) -> Dict[str, Any]:
         """Parse natural language command into structured intent"""
+        cached_intent, cache_key, embedding, signature = self._lookup_intent(command)
+        if cached_intent is not None:
+            return cached_intent
+        
         try:
-            # AI-powered intent parsing
-            prompt = f"""Parse this calendar command into structured intent:
-
-Command: "{command}"
-
-Extract:
-1. Action (create, read, update, delete, find, schedule)
-2. Event details (title, description, start_time, end_time, location, attendees)
-3. Time expressions (today, tomorrow, next week, 3pm, etc.)
-4. Priority level
-5. Event type (meeting, reminder, task, event)
-
-Format as JSON with keys: action, event_details, time_expressions, priority, event_type, confidence"""
-
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a calendar intent parser. Extract structured information from natural language commands."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=400,
-                temperature=0.1
-            )
+            response = self.client.chat.completions.create(**self._intent_request(command))
             
             ai_response = response.choices[0].message.content
             
-            # Try to parse AI response
-            try:
-                parsed = json.loads(ai_response)
-                return parsed
-            except:
-                # Fallback to rule-based parsing
-                return self._rule_based_parsing(command)
+            return self._parse_intent_response(ai_response, command, cache_key, embedding, signature)
                 
         except Exception as e:
             # Fallback to rule-based parsing
             return self._rule_based_parsing(command)
     
+    def _intent_request(self, command: str) -> Dict[str, Any]:
+        """Build the chat completion arguments for parsing one command"""
+        # The schema carries the structure, so the prompt is just the command, last
+        return {
+            'model': self.intent_model,
+            'messages': [
+                {"role": "system", "content": INTENT_SYSTEM_PROMPT},
+                {"role": "user", "content": command}
+            ],
+            'response_format': {
+                "type": "json_schema",
+                "json_schema": {"name": "CalendarIntent", "strict": True, "schema": CALENDAR_INTENT_SCHEMA}
+            },
+            'max_tokens': 150,
+            'temperature': 0.1
+        }
+    
+    def _parse_intent_response(self, ai_response: str, command: str, cache_key: str,
+                               embedding: Optional[np.ndarray], signature: Optional[str]) -> Dict[str, Any]:
+        """Parse the model's JSON reply and cache it, falling back to rule-based parsing"""
+        # Structured output always matches the schema unless cut off at max_tokens
+        try:
+            parsed = json.loads(ai_response)
+        except:
+            # Fallback to rule-based parsing
+            return self._rule_based_parsing(command)
+        
+        self._store_cached_intent(cache_key, parsed)
+        self._store_similar_intent(embedding, signature, parsed)
+        return copy.deepcopy(parsed)
+    
+    def _lookup_intent(self, command: str) -> Tuple[Optional[Dict[str, Any]], str, Optional[np.ndarray], Optional[str]]:
+        """Find a rule-based or cached intent for a command, also returning the keys needed to cache a new one"""
+        # Cheapest first: a confident rule parse costs microseconds and needs no cache
+        rule_intent = self._rule_based_parsing(command)
+        if rule_intent['confidence'] >= self.rule_confidence_threshold:
+            self.intent_sources['rules'] += 1
+            return rule_intent, None, None, None
+        
+        cache_key = command.strip().lower()
+        cached_intent = self._get_cached_intent(cache_key)
+        if cached_intent is not None:
+            self.intent_sources['exact'] += 1
+            return copy.deepcopy(cached_intent), cache_key, None, None
+        
+        embedding = self._embed_command(cache_key)
+        signature = self._intent_signature(cache_key, rule_intent['action'])
+        similar_intent = self._find_similar_intent(embedding, signature)
+        if similar_intent is not None:
+            self.intent_sources['semantic'] += 1
+            self._store_cached_intent(cache_key, similar_intent)
+            return copy.deepcopy(similar_intent), cache_key, embedding, signature
+        
+        self.intent_sources['model'] += 1
+        return None, cache_key, embedding, signature
+    
+    def _get_cached_intent(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Return a cached intent for an exact command, marking it as recently used"""
+        with self._intent_cache_lock:
+            cached = self.intent_cache.get(cache_key)
+            if cached is not None:
+                self.intent_cache.move_to_end(cache_key)
+            return cached
+    
+    def _store_cached_intent(self, cache_key: str, intent: Dict[str, Any]) -> None:
+        """Cache an intent for an exact command, evicting the least recently used entry when full"""
+        with self._intent_cache_lock:
+            self.intent_cache[cache_key] = intent
+            self.intent_cache.move_to_end(cache_key)
+            if len(self.intent_cache) > self.intent_cache_size:
+                self.intent_cache.popitem(last=False)
+    
+    def _intent_signature(self, command: str, action: str) -> str:
+        """Summarise the action, times and details a command mentions, as found by the rule-based parser"""
+        # "3pm" and "4pm", or "cancel" and "schedule", embed almost identically; matching
+        # signatures keeps a semantic hit from returning another command's action, time or attendee
+        return json.dumps([action, self._extract_time_expressions(command), self._extract_event_details(command)], sort_keys=True)
+    
+    def _embed_command(self, command: str) -> Optional[np.ndarray]:
+        """Embed a command for the semantic cache, or None if the model is unavailable"""
+        if self.embedding_model is None:
+            return None
+        try:
+            return self.embedding_model.encode([command], normalize_embeddings=True).astype(np.float32)
+        except Exception as e:
+            print(f"Failed to embed command: {e}")
+            return None
+    
+    def _find_similar_intent(self, embedding: Optional[np.ndarray], signature: str) -> Optional[Dict[str, Any]]:
+        """Return the intent of the closest earlier command if it is similar enough"""
+        return self.semantic_cache.find(embedding, signature)
+    
+    def _store_similar_intent(self, embedding: Optional[np.ndarray], signature: str, intent: Dict[str, Any]) -> None:
+        """Add a parsed command to the semantic cache; the background writer persists it"""
+        self.semantic_cache.add(embedding, signature, intent)
+    
     def _rule_based_parsing(self, command: str) -> Dict[str, Any]:
         """Fallback rule-based parsing for calendar commands"""
         command_lower = command.lower()
         
-        # Detect action
-        action = 'read'
-        if any(word in command_lower for word in ['create', 'add', 'schedule', 'book']):
-            action = 'create'
-        elif any(word in command_lower for word in ['update', 'change', 'modify']):
-            action = 'update'
-        elif any(word in command_lower for word in ['delete', 'remove', 'cancel']):
-            action = 'delete'
-        elif any(word in command_lower for word in ['find', 'search', 'show']):
-            action = 'read'
+        # Detect action: collect every trigger word in one scan, then apply priority
+        found_actions = {_ACTION_KEYWORDS[word] for word in _ACTION_RE.findall(command_lower)}
+        action = next((candidate for candidate in _ACTION_PRIORITY if candidate in found_actions), 'read')
         
         # Extract time expressions
         time_expressions = self._extract_time_expressions(command)
@@ -102,50 +581,50 @@ Format as JSON with keys: action, event_details, time_expressions, priority, eve
         # Extract event details
         event_details = self._extract_event_details(command)
         
+        # A location that still holds a time ("at 3pm in the office") means the rules
+        # can't tell the two apart, and a negation may reverse the action, so neither
+        # parse ever counts as confident
+        features = {
+            'action': len(found_actions) == 1,
+            'time': bool(time_expressions),
+            'title': 'title' in event_details
+        }
+        location = event_details.get('location')
+        ambiguous = (location is not None and _TIME_RE.search(location) is not None) or _NEGATION_RE.search(command_lower) is not None
+        confidence = 0.0 if ambiguous else sum(_RULE_FEATURE_WEIGHTS[name] for name, found in features.items() if found)
+        
         return {
             'action': action,
             'event_details': event_details,
             'time_expressions': time_expressions,
             'priority': 'medium',
             'event_type': 'meeting',
-            'confidence': 0.7
+            'confidence': round(confidence, 2)
         }
     
     def _extract_time_expressions(self, command: str) -> List[str]:
         """Extract time expressions from command"""
-        time_patterns = [
-            r'\b(today|tomorrow|yesterday)\b',
-            r'\b(next|last)\s+(week|month|year|monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b',
-            r'\b(\d{1,2}):?(\d{2})?\s*(am|pm)?\b',
-            r'\b(\d{1,2})\s*(am|pm)\b',
-            r'\b(in|at)\s+(\d{1,2})\s*(am|pm)\b',
-            r'\b(\d{1,2})\s*(o\'?clock)\b',
-            r'\b(morning|afternoon|evening|night)\b'
-        ]
-        
-        time_expressions = []
-        for pattern in time_patterns:
-            matches = re.findall(pattern, command, re.IGNORECASE)
-            time_expressions.extend(matches)
-        
-        return time_expressions
+        return _TIME_RE.findall(command)
     
     def _extract_event_details(self, command: str) -> Dict[str, Any]:
         """Extract event details from command"""
         details = {}
         
         # Extract title (usually after "meeting with" or similar)
-        title_match = re.search(r'(?:meeting|call|appointment)\s+with\s+([^,\.]+)', command, re.IGNORECASE)
+        title_match = _TITLE_RE.search(command)
         if title_match:
             details['title'] = title_match.group(1).strip()
         
         # Extract location
-        location_match = re.search(r'(?:at|in|location)\s+([^,\.]+)', command, re.IGNORECASE)
+        location_match = _LOCATION_RE.search(command)
         if location_match:
-            details['location'] = location_match.group(1).strip()
+            location = location_match.group(1).strip()
+            # "at 3pm" is a time, not a place
+            if not _TIME_RE.fullmatch(location):
+                details['location'] = location
         
         # Extract duration
-        duration_match = re.search(r'(\d+)\s*(hour|hr|minute|min)s?', command, re.IGNORECASE)
+        duration_match = _DURATION_RE.search(command)
         if duration_match:
             details['duration'] = {
                 'value': int(duration_match.group(1)),
@@ -175,15 +654,18 @@ Format as JSON with keys: action, event_details, time_expressions, priority, eve
             # Parse time expressions
             start_time, end_time = self._parse_time_expressions(intent.get('time_expressions', []))
             
+            # Schema-parsed intents send null for details the command didn't mention
+            event_details = intent.get('event_details') or {}
+            
             # Build event data
             event_data = {
-                'id': str(uuid.uuid4()),
+                'id': uuid.uuid4().hex,
                 'user_id': user_id,
-                'title': intent.get('event_details', {}).get('title', 'New Event'),
-                'description': intent.get('event_details', {}).get('description', ''),
+                'title': event_details.get('title') or 'New Event',
+                'description': event_details.get('description') or '',
                 'start_time': start_time,
                 'end_time': end_time,
-                'location': intent.get('event_details', {}).get('location', ''),
+                'location': event_details.get('location') or '',
                 'event_type': intent.get('event_type', 'meeting'),
                 'priority': intent.get('priority', 'medium'),
                 'status': 'scheduled',
@@ -193,6 +675,7 @@ Format as JSON with keys: action, event_details, time_expressions, priority, eve
             
             # Here you would save to database
             # For now, return the event data
+            self._invalidate_empty_ranges(user_id)
             return {
                 'action': 'created',
                 'event': event_data,
@@ -217,12 +700,13 @@ Format as JSON with keys: action, event_details, time_expressions, priority, eve
             
             # Here you would query the database
             # For now, return mock results
+            now = datetime.now()
             mock_events = [
                 {
-                    'id': str(uuid.uuid4()),
+                    'id': uuid.uuid4().hex,
                     'title': 'Team Meeting',
-                    'start_time': datetime.now().isoformat(),
-                    'end_time': (datetime.now() + timedelta(hours=1)).isoformat(),
+                    'start_time': now.isoformat(),
+                    'end_time': (now + timedelta(hours=1)).isoformat(),
                     'location': 'Conference Room A'
                 }
             ]
@@ -261,23 +745,23 @@ Format as JSON with keys: action, event_details, time_expressions, priority, eve
             if 'tomorrow' in expr_lower:
                 start_time = (now + timedelta(days=1)).replace(hour=9, minute=0, second=0, microsecond=0)
                 end_time = start_time + timedelta(hours=1)
-            elif 'next week' in expr_lower:
+                continue
+            if 'next week' in expr_lower:
                 start_time = (now + timedelta(weeks=1)).replace(hour=9, minute=0, second=0, microsecond=0)
                 end_time = start_time + timedelta(hours=1)
-            elif 'next monday' in expr_lower:
-                days_ahead = 7 - now.weekday()
-                if days_ahead <= 0:
-                    days_ahead += 7
+                continue
+            
+            weekday_match = _NEXT_WEEKDAY_RE.search(expr_lower)
+            if weekday_match:
+                # The next occurrence strictly after today, a full week ahead if it is today
+                days_ahead = (_WEEKDAYS[weekday_match.group(1)] - now.weekday()) % 7 or 7
                 start_time = (now + timedelta(days=days_ahead)).replace(hour=9, minute=0, second=0, microsecond=0)
                 end_time = start_time + timedelta(hours=1)
-            elif 'morning' in expr_lower:
-                start_time = start_time.replace(hour=9, minute=0)
-                end_time = start_time + timedelta(hours=1)
-            elif 'afternoon' in expr_lower:
-                start_time = start_time.replace(hour=14, minute=0)
-                end_time = start_time + timedelta(hours=1)
-            elif 'evening' in expr_lower:
-                start_time = start_time.replace(hour=18, minute=0)
+                continue
+            
+            daypart_match = _DAYPART_RE.search(expr_lower)
+            if daypart_match:
+                start_time = start_time.replace(hour=_DAYPART_HOURS[daypart_match.group(0)], minute=0)
                 end_time = start_time + timedelta(hours=1)
         
         return start_time, end_time
@@ -290,37 +774,66 @@ Format as JSON with keys: action, event_details, time_expressions, priority, eve
             end_dt = None
             
             if start_date:
-                start_dt = parser.parse(start_date)
+                start_dt = _parse_event_time(start_date)
             if end_date:
-                end_dt = parser.parse(end_date)
+                end_dt = _parse_event_time(end_date)
+            
+            # Most lookups on a quiet calendar come back empty; skip the query when we already know
+            empty_key = (user_id, self.calendar_versions[user_id], start_date, end_date)
+            if self._is_known_empty(empty_key):
+                return []
             
             # Here you would query the database
             # For now, return mock events
-            mock_events = [
+            now = datetime.now()
+            events = [
                 {
-                    'id': str(uuid.uuid4()),
+                    'id': uuid.uuid4().hex,
                     'title': 'Daily Standup',
-                    'start_time': datetime.now().isoformat(),
-                    'end_time': (datetime.now() + timedelta(minutes=30)).isoformat(),
+                    'start_time': now.isoformat(),
+                    'end_time': (now + timedelta(minutes=30)).isoformat(),
                     'location': 'Zoom',
                     'event_type': 'meeting'
                 },
                 {
-                    'id': str(uuid.uuid4()),
+                    'id': uuid.uuid4().hex,
                     'title': 'Project Review',
-                    'start_time': (datetime.now() + timedelta(days=1)).isoformat(),
-                    'end_time': (datetime.now() + timedelta(days=1, hours=2)).isoformat(),
+                    'start_time': (now + timedelta(days=1)).isoformat(),
+                    'end_time': (now + timedelta(days=1, hours=2)).isoformat(),
                     'location': 'Conference Room B',
                     'event_type': 'meeting'
                 }
             ]
             
-            return mock_events
+            if not events:
+                self._remember_empty(empty_key)
+            return events
             
         except Exception as e:
             print(f"Failed to get events: {e}")
             return []
     
+    def _is_known_empty(self, key: Tuple) -> bool:
+        """Check whether a range lookup is known to return no events, marking it as recently used"""
+        with self._empty_ranges_lock:
+            if key not in self.empty_ranges:
+                return False
+            self.empty_ranges.move_to_end(key)
+            return True
+    
+    def _remember_empty(self, key: Tuple) -> None:
+        """Record a range lookup that returned no events, evicting the least recently used entry when full"""
+        with self._empty_ranges_lock:
+            self.empty_ranges[key] = True
+            self.empty_ranges.move_to_end(key)
+            if len(self.empty_ranges) > self.empty_ranges_size:
+                self.empty_ranges.popitem(last=False)
+    
+    def _invalidate_empty_ranges(self, user_id: str) -> None:
+        """Forget every empty range recorded for a user after their calendar changes"""
+        with self._empty_ranges_lock:
+            self.calendar_versions[user_id] += 1
+    
     def create_event(self, user_id: str, event_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a calendar event with structured data"""
         try:
@@ -332,14 +845,14 @@ Format as JSON with keys: action, event_details, time_expressions, priority, eve
             
             # Parse datetime strings
             try:
-                start_time = parser.parse(event_data['start_time'])
-                end_time = parser.parse(event_data['end_time'])
+                start_time = _parse_datetime(event_data['start_time'])
+                end_time = _parse_datetime(event_data['end_time'])
             except Exception as e:
                 return {'error': f'Invalid datetime format: {str(e)}'}
             
             # Create event object
             event = {
-                'id': str(uuid.uuid4()),
+                'id': uuid.uuid4().hex,
                 'user_id': user_id,
                 'title': event_data['title'],
                 'description': event_data.get('description', ''),
@@ -356,6 +869,7 @@ Format as JSON with keys: action, event_details, time_expressions, priority, eve
             
             # Here you would save to database
             # For now, return the event
+            self._invalidate_empty_ranges(user_id)
             return {
                 'success': True,
                 'event': event,
@@ -368,51 +882,36 @@ Format as JSON with keys: action, event_details, time_expressions, priority, eve
     def _log_mcp_command(self, user_id: str, command: str, intent: Dict[str, Any], result: Dict[str, Any]) -> None:
         """Log MCP command execution for analytics"""
         try:
-            # Here you would save to database
-            # For now, just print for debugging
-            print(f"MCP Command Log:")
-            print(f"  User: {user_id}")
-            print(f"  Command: {command}")
-            print(f"  Intent: {json.dumps(intent, indent=2)}")
-            print(f"  Result: {json.dumps(result, indent=2)}")
-            print(f"  Timestamp: {datetime.utcnow().isoformat()}")
+            # Persisted telemetry is written by the API layer; this is the debug trail
+            logger.info("MCP command", extra={'mcp': {
+                'user_id': user_id,
+                'command': command,
+                'intent': intent,
+                'result': result
+            }})
         except Exception as e:
             print(f"Failed to log MCP command: {e}")
     
     def get_calendar_summary(self, user_id: str, date_range: str = 'week') -> Dict[str, Any]:
         """Get a summary of calendar events for a date range"""
         try:
-            now = datetime.now(self.timezone)
-            
-            if date_range == 'today':
-                start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-                end_date = start_date + timedelta(days=1)
-            elif date_range == 'week':
-                start_date = now - timedelta(days=now.weekday())
-                start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-                end_date = start_date + timedelta(days=7)
-            elif date_range == 'month':
-                start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-                if now.month == 12:
-                    end_date = now.replace(year=now.year + 1, month=1, day=1)
-                else:
-                    end_date = now.replace(month=now.month + 1, day=1)
-            else:
-                start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-                end_date = start_date + timedelta(days=1)
+            start_date, end_date = self._range_bounds(datetime.now(self.timezone), date_range)
             
             # Get events for the range
             events = self.get_events(user_id, start_date.isoformat(), end_date.isoformat())
             
+            # Tally event types in one pass
+            type_counts = Counter(event.get('event_type') for event in events)
+            
             # Generate summary
             summary = {
                 'date_range': date_range,
                 'start_date': start_date.isoformat(),
                 'end_date': end_date.isoformat(),
                 'total_events': len(events),
-                'meetings': len([e for e in events if e.get('event_type') == 'meeting']),
-                'reminders': len([e for e in events if e.get('event_type') == 'reminder']),
-                'tasks': len([e for e in events if e.get('event_type') == 'task']),
+                'meetings': type_counts['meeting'],
+                'reminders': type_counts['reminder'],
+                'tasks': type_counts['task'],
                 'upcoming_events': events[:5],  # Next 5 events
                 'busiest_day': self._find_busiest_day(events),
                 'free_time_slots': self._find_free_time_slots(events, start_date, end_date)
@@ -423,60 +922,117 @@ Format as JSON with keys: action, event_details, time_expressions, priority, eve
         except Exception as e:
             return {'error': f'Failed to generate calendar summary: {str(e)}'}
     
+    def _range_bounds(self, now: datetime, date_range: str) -> Tuple[datetime, datetime]:
+        """Return the start and end of the 'today', 'week' or 'month' range containing now"""
+        day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        
+        if date_range == 'week':
+            start_date = day_start - timedelta(days=now.weekday())
+            return start_date, start_date + timedelta(days=7)
+        if date_range == 'month':
+            start_date = day_start.replace(day=1)
+            if now.month == 12:
+                return start_date, start_date.replace(year=now.year + 1, month=1)
+            return start_date, start_date.replace(month=now.month + 1)
+        
+        # 'today' and anything unrecognised
+        return day_start, day_start + timedelta(days=1)
+    
     def _find_busiest_day(self, events: List[Dict[str, Any]]) -> Optional[str]:
         """Find the busiest day in the event list"""
         if not events:
             return None
         
-        day_counts = {}
-        for event in events:
-            try:
-                start_time = parser.parse(event['start_time'])
-                day_key = start_time.strftime('%Y-%m-%d')
-                day_counts[day_key] = day_counts.get(day_key, 0) + 1
-            except:
-                continue
+        # Start times are ISO strings, so the first ten characters are the local date
+        day_strings = [str(event.get('start_time', ''))[:10] for event in events]
+        try:
+            days = np.array(day_strings, dtype='datetime64[D]')
+        except ValueError:
+            # Skip malformed entries only when the fast path trips over one
+            days = np.array([day for day in day_strings if self._is_iso_date(day)], dtype='datetime64[D]')
         
-        if day_counts:
-            busiest_day = max(day_counts, key=day_counts.get)
-            return busiest_day
+        # Missing start times convert to NaT rather than raising
+        days = days[~np.isnat(days)]
+        if days.size == 0:
+            return None
         
-        return None
+        unique_days, counts = np.unique(days, return_counts=True)
+        return str(unique_days[counts.argmax()])
+    
+    def _is_iso_date(self, value: str) -> bool:
+        """Check whether a string is a YYYY-MM-DD date numpy can parse"""
+        try:
+            np.datetime64(value, 'D')
+            return len(value) == 10
+        except ValueError:
+            return False
     
     def _find_free_time_slots(self, events: List[Dict[str, Any]], start_date: datetime, end_date: datetime) -> List[Dict[str, Any]]:
         """Find free time slots in the calendar"""
-        # This is a simplified implementation
-        # In production, you'd want more sophisticated time slot analysis
+        # Hourly slots from start_date; a slot is free when no event covers its start.
+        # Events are merged into sorted busy intervals once, then swept alongside the slots.
+        busy = self._merge_busy_intervals(events, start_date)
+        slot_length = timedelta(hours=1)
         
         free_slots = []
         current_time = start_date
+        index = 0
         
         while current_time < end_date:
-            # Check if there's an event at this time
-            has_event = any(
-                self._time_overlaps(current_time, event)
-                for event in events
-            )
+            # Skip busy intervals that ended before this slot
+            while index < len(busy) and busy[index][1] <= current_time:
+                index += 1
             
-            if not has_event:
-                # Found a free slot
-                slot_end = min(current_time + timedelta(hours=1), end_date)
-                free_slots.append({
-                    'start_time': current_time.isoformat(),
-                    'end_time': slot_end.isoformat(),
-                    'duration_minutes': int((slot_end - current_time).total_seconds() / 60)
-                })
+            if index < len(busy) and busy[index][0] <= current_time:
+                # Jump to the first slot at or after the end of this busy interval
+                current_time += -(-(busy[index][1] - current_time) // slot_length) * slot_length
+                continue
+            
+            # Found a free slot
+            slot_end = min(current_time + slot_length, end_date)
+            free_slots.append({
+                'start_time': current_time.isoformat(),
+                'end_time': slot_end.isoformat(),
+                'duration_minutes': int((slot_end - current_time).total_seconds() / 60)
+            })
             
-            current_time += timedelta(hours=1)
+            current_time += slot_length
         
         return free_slots
     
-    def _time_overlaps(self, time: datetime, event: Dict[str, Any]) -> bool:
-        """Check if a time overlaps with an event"""
-        try:
-            event_start = parser.parse(event['start_time'])
-            event_end = parser.parse(event['end_time'])
-            
-            return event_start <= time < event_end
-        except:
-            return False
+    def _merge_busy_intervals(self, events: List[Dict[str, Any]], reference: datetime) -> List[List[datetime]]:
+        """Parse each event once and merge overlapping [start, end) intervals in start order"""
+        intervals = []
+        for event in events:
+            try:
+                event_start = _parse_event_time(event['start_time'])
+                event_end = _parse_event_time(event['end_time'])
+            except (KeyError, TypeError, ValueError, OverflowError):
+                continue
+            event_start = self._match_reference_timezone(event_start, reference)
+            event_end = self._match_reference_timezone(event_end, reference)
+            if event_start < event_end:
+                intervals.append((event_start, event_end))
+        
+        intervals.sort()
+        merged = []
+        for event_start, event_end in intervals:
+            if merged and event_start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], event_end)
+            else:
+                merged.append([event_start, event_end])
+        
+        return merged
+    
+    def _match_reference_timezone(self, value: datetime, reference: datetime) -> datetime:
+        """Give an event time the same awareness as the reference so the two can be compared"""
+        if reference.tzinfo is not None:
+            if value.tzinfo is not None:
+                return value
+            # Naive event times are in the reference's zone; pytz zones must localize rather than replace
+            tz = reference.tzinfo
+            return tz.localize(value) if hasattr(tz, 'localize') else value.replace(tzinfo=tz)
+        if value.tzinfo is None:
+            return value
+        # A naive reference is wall-clock time in the calendar's timezone
+        return value.astimezone(self.timezone).replace(tzinfo=None)
@@ -1,22 +1,191 @@
 import os
 import json
 import hashlib
+import itertools
 import uuid
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 from typing import List, Dict, Any, Optional, Tuple
 import openai
 from openai import OpenAI
 import chromadb
 from chromadb.config import Settings
+import ctranslate2
+import torch
 from sentence_transformers import SentenceTransformer
+from transformers import AutoTokenizer
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 import re
 
+class EmbeddingBackend:
+    """Sentence embeddings from a CTranslate2-converted encoder, with the SentenceTransformer encode() interface"""
+    
+    def __init__(self, model_path: str, device: str = 'cpu', compute_type: str = 'int8', intra_threads: int = 0):
+        # The converter copies the tokenizer files next to model.bin
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+        self.encoder = ctranslate2.Encoder(model_path, device=device, compute_type=compute_type, intra_threads=intra_threads)
+        self.dimension = None
+    
+    def get_sentence_embedding_dimension(self) -> int:
+        """Return the embedding width, probing the model once if needed"""
+        if self.dimension is None:
+            self.dimension = self.encode(['dimension probe']).shape[1]
+        return self.dimension
+    
+    def encode(self, sentences: List[str], batch_size: int = 32, convert_to_numpy: bool = True,
+               normalize_embeddings: bool = False, show_progress_bar: bool = False) -> np.ndarray:
+        """Mean-pool the encoder output for each sentence, in input order"""
+        # Sort by length so each batch pads to similar sizes, then restore the order
+        order = sorted(range(len(sentences)), key=lambda i: len(sentences[i]))
+        embeddings = [None] * len(sentences)
+        
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            encoded = self.tokenizer([sentences[i] for i in batch], truncation=True, max_length=256)
+            output = self.encoder.forward_batch(encoded['input_ids'], token_type_ids=encoded.get('token_type_ids'))
+            hidden_state = output.last_hidden_state
+            if hidden_state.device != 'cpu':
+                # GPU outputs expose no array interface; copy to host memory before pooling
+                hidden_state = hidden_state.to_device(ctranslate2.Device.cpu)
+            hidden = np.array(hidden_state, dtype=np.float32)
+            
+            lengths = np.array([len(ids) for ids in encoded['input_ids']], dtype=np.float32)
+            mask = (np.arange(hidden.shape[1])[None, :] < lengths[:, None]).astype(np.float32)
+            pooled = (hidden * mask[:, :, None]).sum(axis=1) / lengths[:, None]
+            for row, i in enumerate(batch):
+                embeddings[i] = pooled[row]
+        
+        result = np.stack(embeddings) if embeddings else np.zeros((0, self.dimension or 0), dtype=np.float32)
+        if normalize_embeddings and len(result):
+            result /= np.linalg.norm(result, axis=1, keepdims=True)
+        return result
+
+class EmbeddingBatcher:
+    """Coalesce concurrent single-text encode requests into one batched forward pass"""
+    
+    def __init__(self, model, max_batch_size: int = 64, max_wait: float = 0.005):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.worker = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+        self.worker.start()
+    
+    def encode_async(self, text: str) -> Future:
+        """Queue a text for embedding; the future resolves to its normalised vector"""
+        future = Future()
+        self.requests.put((text, future))
+        return future
+    
+    def _run(self):
+        """Collect requests until the batch is full or the oldest has waited max_wait, then encode them together"""
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            try:
+                # encode() length-sorts the batch itself, so mixed lengths pad little
+                embeddings = self.model.encode(
+                    [text for text, _ in batch],
+                    batch_size=self.max_batch_size,
+                    convert_to_numpy=True,
+                    normalize_embeddings=True,
+                    show_progress_bar=False
+                )
+                for (_, future), embedding in zip(batch, embeddings):
+                    future.set_result(embedding)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+@lru_cache(maxsize=4)
+def _get_embedding_model(name: str):
+    """Load an embedding model once per process, using the CTranslate2 backend when name is a converted model directory"""
+    # Several Flask workers on one host each get their own model; capping
+    # intra-op threads keeps them from oversubscribing the cores
+    num_threads = int(os.getenv('EMBEDDING_NUM_THREADS') or min(4, os.cpu_count() or 1))
+    
+    # EMBEDDING_MODEL may point at an int8 CTranslate2 conversion of all-MiniLM-L6-v2;
+    # quantized weights halve memory traffic and run 2-4x faster on CPU
+    if os.path.isfile(os.path.join(name, 'model.bin')):
+        device = os.getenv('EMBEDDING_DEVICE') or 'auto'
+        if device == 'auto':
+            device = 'cuda' if ctranslate2.get_cuda_device_count() > 0 else 'cpu'
+        compute_type = os.getenv('EMBEDDING_COMPUTE_TYPE') or ('float16' if device == 'cuda' else 'int8')
+        return EmbeddingBackend(name, device=device, compute_type=compute_type, intra_threads=num_threads)
+    
+    torch.set_num_threads(num_threads)
+    model = SentenceTransformer(name)
+    # Half precision halves weight traffic on GPU with no loss in retrieval quality for MiniLM;
+    # CPUs without bf16 units run fp16 slower, so they stay in float32
+    if model.device.type == 'cuda' and os.getenv('EMBEDDING_COMPUTE_TYPE') != 'float32':
+        model.half()
+    return model
+
+# Chunk boundaries: blank lines between paragraphs, and sentence punctuation in long paragraphs
+_PARAGRAPH_BREAK_RE = re.compile(r'\n\n+')
+_SENTENCE_BREAK_RE = re.compile(r'[.!?]+')
+
+# Key terms are words of three or more characters that aren't stop words
+_KEY_TERM_RE = re.compile(r'\b\w{3,}\b')
+_STOP_WORDS = frozenset({'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'})
+
+def _split_spans(pattern: re.Pattern, text: str, start: int, end: int):
+    """Yield the (start, end) offsets of the pieces of text[start:end] between matches of pattern"""
+    for match in pattern.finditer(text, start, end):
+        yield start, match.start()
+        start = match.end()
+    yield start, end
+
+def _strip_span(text: str, start: int, end: int) -> Tuple[int, str]:
+    """Return text[start:end] without surrounding whitespace, and the offset where it begins"""
+    piece = text[start:end]
+    stripped = piece.lstrip()
+    return start + len(piece) - len(stripped), stripped.rstrip()
+
+def _build_where(filters: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn a dict of field equalities into a Chroma where clause"""
+    # Chroma accepts exactly one top-level key, so several conditions go under $and
+    if len(filters) <= 1:
+        return filters
+    return {"$and": [{key: value} for key, value in filters.items()]}
+
 class RAGService:
     def __init__(self):
         self.client = OpenAI()
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        self.embedding_model = _get_embedding_model(os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2'))
+        # Query embeddings from concurrent requests share one forward pass
+        self.embedding_batcher = EmbeddingBatcher(self.embedding_model)
+        
+        # Repeated queries skip the encoder and the AI analysis round trip
+        self.query_embedding_cache = OrderedDict()
+        self.query_embedding_cache_size = 4096
+        self.enhancement_cache = OrderedDict()  # (stored_at, analysis) by prompt hash
+        self.enhancement_cache_size = 1024
+        self.enhancement_cache_ttl = 3600
+        self.enhancement_skip_score = 0.85
+        self._cache_lock = threading.Lock()
+        
+        # Blocking work (uncached AI analyses, document indexing) runs here so
+        # request threads return as soon as retrieval does
+        self.executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='rag-io')
+        self.analysis_futures = OrderedDict()
+        self.analysis_futures_size = 1024
+        self._analysis_futures_lock = threading.Lock()
+        
         self.chroma_client = None
         self.collection = None
         self.initialize_chroma()
@@ -36,10 +205,19 @@ class RAGService:
                 )
             )
             
-            # Get or create collection
+            # Get or create collection. Chroma's defaults (M=16, construction_ef=100,
+            # search_ef=10) trade recall for speed; a wider graph and beam keep recall
+            # near 1.0 as the knowledge base grows. M and construction_ef are fixed
+            # once the index is built, so they only apply to a new collection.
             self.collection = self.chroma_client.get_or_create_collection(
                 name="voiceloop_knowledge",
-                metadata={"hnsw:space": "cosine"}
+                metadata={
+                    "hnsw:space": "cosine",
+                    "hnsw:M": 24,
+                    "hnsw:construction_ef": 128,
+                    "hnsw:search_ef": 100,
+                    "hnsw:num_threads": os.cpu_count() or 1
+                }
             )
             
         except Exception as e:
@@ -50,44 +228,55 @@ class RAGService:
     def process_document(self, document_text: str, metadata: Dict[str, Any], user_id: str) -> str:
         """Process a document and add it to the knowledge base"""
         try:
-            # Generate document ID
-            doc_id = str(uuid.uuid4())
+            # Generate document ID, in the same hex form as the model primary keys
+            doc_id = uuid.uuid4().hex
             
             # Chunk the document
             chunks = self.chunk_text(document_text, metadata)
             
-            # Generate embeddings for each chunk
-            chunk_ids = []
-            chunk_texts = []
-            chunk_metadatas = []
-            
-            for i, chunk in enumerate(chunks):
-                chunk_id = f"{doc_id}_chunk_{i}"
-                chunk_ids.append(chunk_id)
-                chunk_texts.append(chunk['text'])
-                
-                # Enhanced metadata for each chunk
-                chunk_metadata = {
-                    'document_id': doc_id,
-                    'user_id': user_id,
+            # Chunk IDs stay readable and derive from the document ID, so no per-chunk UUID is drawn
+            chunk_ids = [f"{doc_id}_chunk_{i}" for i in range(len(chunks))]
+            chunk_texts = [chunk['text'] for chunk in chunks]
+            
+            # Fields shared by every chunk, including one timestamp for the whole document
+            document_fields = {
+                'document_id': doc_id,
+                'user_id': user_id,
+                'document_title': metadata.get('title', 'Unknown'),
+                'document_type': metadata.get('type', 'unknown'),
+                'category': metadata.get('category', 'general'),
+                'tags': ','.join(metadata.get('tags', [])),  # Chroma metadata values must be scalars
+                'created_timestamp': datetime.utcnow().isoformat()
+            }
+            
+            # Enhanced metadata for each chunk
+            chunk_metadatas = [
+                {
+                    **document_fields,
                     'chunk_index': i,
                     'start_position': chunk['start'],
                     'end_position': chunk['end'],
-                    'chunk_type': chunk['type'],
-                    'document_title': metadata.get('title', 'Unknown'),
-                    'document_type': metadata.get('type', 'unknown'),
-                    'category': metadata.get('category', 'general'),
-                    'tags': metadata.get('tags', []),
-                    'created_timestamp': datetime.utcnow().isoformat()
+                    'chunk_type': chunk['type']
                 }
-                chunk_metadatas.append(chunk_metadata)
+                for i, chunk in enumerate(chunks)
+            ]
             
             # Add to ChromaDB
-            if self.collection:
+            if self.collection and chunk_texts:
+                # One batched forward pass for all chunks instead of leaving Chroma to
+                # embed them; encode() length-sorts internally, so batches pad little
+                embeddings = self.embedding_model.encode(
+                    chunk_texts,
+                    batch_size=64,
+                    convert_to_numpy=True,
+                    normalize_embeddings=True,
+                    show_progress_bar=False
+                )
                 self.collection.add(
                     ids=chunk_ids,
                     documents=chunk_texts,
-                    metadatas=chunk_metadatas
+                    metadatas=chunk_metadatas,
+                    embeddings=embeddings.astype(np.float32, copy=False)
                 )
             
             return doc_id
@@ -95,33 +284,25 @@ class RAGService:
         except Exception as e:
             raise Exception(f"Failed to process document: {str(e)}")
     
+    def process_document_async(self, document_text: str, metadata: Dict[str, Any], user_id: str) -> Future:
+        """Index a document in the background; the future resolves to its document ID"""
+        return self.executor.submit(self.process_document, document_text, metadata, user_id)
+    
     def chunk_text(self, text: str, metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Intelligently chunk text based on content structure"""
         chunks = []
         
-        # Split by paragraphs first
-        paragraphs = text.split('\n\n')
-        
-        current_position = 0
-        chunk_index = 0
-        
-        for paragraph in paragraphs:
-            paragraph = paragraph.strip()
+        # Walk paragraph and sentence spans by offset, so start/end index the original text
+        for span_start, span_end in _split_spans(_PARAGRAPH_BREAK_RE, text, 0, len(text)):
+            paragraph_start, paragraph = _strip_span(text, span_start, span_end)
             if not paragraph:
-                current_position += len(paragraph) + 2  # +2 for \n\n
                 continue
             
             # If paragraph is too long, split by sentences
             if len(paragraph) > 1000:
-                sentences = re.split(r'[.!?]+', paragraph)
-                sentence_start = current_position
-                
-                for sentence in sentences:
-                    sentence = sentence.strip()
-                    if not sentence:
-                        sentence_start += len(sentence) + 1
-                        continue
-                    
+                paragraph_end = paragraph_start + len(paragraph)
+                for sentence_span in _split_spans(_SENTENCE_BREAK_RE, text, paragraph_start, paragraph_end):
+                    sentence_start, sentence = _strip_span(text, *sentence_span)
                     if len(sentence) > 100:  # Only add substantial sentences
                         chunks.append({
                             'text': sentence,
@@ -129,21 +310,14 @@ class RAGService:
                             'end': sentence_start + len(sentence),
                             'type': 'sentence'
                         })
-                        chunk_index += 1
-                    
-                    sentence_start += len(sentence) + 1
-                
-                current_position += len(paragraph) + 2
             else:
                 # Add paragraph as chunk
                 chunks.append({
                     'text': paragraph,
-                    'start': current_position,
-                    'end': current_position + len(paragraph),
+                    'start': paragraph_start,
+                    'end': paragraph_start + len(paragraph),
                     'type': 'paragraph'
                 })
-                chunk_index += 1
-                current_position += len(paragraph) + 2
         
         return chunks
     
@@ -155,12 +329,13 @@ class RAGService:
                 return []
             
             # Generate query embedding
-            query_embedding = self.embedding_model.encode([query])[0]
+            query_embedding = self._embed_queries([query])[0]
             
             # Build search filters
             search_filters = {"user_id": user_id}
             if filters:
                 search_filters.update(filters)
+            search_filters = _build_where(search_filters)
             
             # Perform search based on type
             if search_type == 'semantic':
@@ -172,7 +347,7 @@ class RAGService:
             else:
                 results = self._semantic_search(query_embedding, search_filters, top_k)
             
-            # Enhance results with AI analysis
+            # Enhance results with AI analysis, inline when cached and in the background otherwise
             enhanced_results = self._enhance_search_results(query, results)
             
             return enhanced_results
@@ -185,7 +360,7 @@ class RAGService:
         """Perform semantic search using embeddings"""
         try:
             results = self.collection.query(
-                query_embeddings=[query_embedding.tolist()],
+                query_embeddings=query_embedding[np.newaxis, :],
                 n_results=top_k,
                 where=filters
             )
@@ -202,14 +377,32 @@ class RAGService:
             # Extract key terms from query
             key_terms = self._extract_key_terms(query)
             
-            # Search for documents containing these terms
+            if not key_terms:
+                return []
+            
+            # Search for documents containing these terms, embedded by us in one batch
+            # rather than by Chroma's own embedding function
             results = self.collection.query(
-                query_texts=key_terms,
+                query_embeddings=self._embed_queries(key_terms),
                 n_results=top_k,
                 where=filters
             )
             
-            return self._format_chroma_results(results)
+            # One result row per term; keep each chunk's best match across terms
+            merged = []
+            for row in range(len(results['ids'])):
+                merged.extend(self._format_chroma_results(results, row))
+            merged.sort(key=lambda x: x['relevance_score'], reverse=True)
+            
+            seen_chunks = set()
+            best_results = []
+            for result in merged:
+                chunk_key = (result['id'], result['chunk_index'])
+                if chunk_key not in seen_chunks:
+                    seen_chunks.add(chunk_key)
+                    best_results.append(result)
+            
+            return best_results[:top_k]
             
         except Exception as e:
             print(f"Keyword search failed: {e}")
@@ -240,22 +433,20 @@ class RAGService:
     def _extract_key_terms(self, query: str) -> List[str]:
         """Extract key terms from query for keyword search"""
         # Simple term extraction - in production, use NLP libraries
-        terms = re.findall(r'\b\w+\b', query.lower())
-        # Filter out common stop words
-        stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'}
-        key_terms = [term for term in terms if term not in stop_words and len(term) > 2]
-        return key_terms[:5]  # Limit to top 5 terms
+        terms = (match.group(0) for match in _KEY_TERM_RE.finditer(query.lower()))
+        # Filter out common stop words, stopping after the top 5 terms
+        return list(itertools.islice((term for term in terms if term not in _STOP_WORDS), 5))
     
-    def _format_chroma_results(self, chroma_results: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Format ChromaDB results into standard format"""
+    def _format_chroma_results(self, chroma_results: Dict[str, Any], row: int = 0) -> List[Dict[str, Any]]:
+        """Format one query's row of ChromaDB results into standard format"""
         formatted_results = []
         
         if not chroma_results or 'documents' not in chroma_results:
             return formatted_results
         
-        documents = chroma_results['documents'][0] if chroma_results['documents'] else []
-        metadatas = chroma_results['metadatas'][0] if chroma_results['metadatas'] else []
-        distances = chroma_results['distances'][0] if chroma_results['distances'] else []
+        documents = chroma_results['documents'][row] if chroma_results['documents'] else []
+        metadatas = chroma_results['metadatas'][row] if chroma_results['metadatas'] else []
+        distances = chroma_results['distances'][row] if chroma_results['distances'] else []
         
         for i, (doc, metadata, distance) in enumerate(zip(documents, metadatas, distances)):
             formatted_results.append({
@@ -267,7 +458,7 @@ class RAGService:
                 'document_title': metadata.get('document_title', 'Unknown'),
                 'document_type': metadata.get('document_type', 'unknown'),
                 'category': metadata.get('category', 'general'),
-                'tags': metadata.get('tags', [])
+                'tags': [tag for tag in metadata.get('tags', '').split(',') if tag]
             })
         
         return formatted_results
@@ -287,55 +478,111 @@ class RAGService:
     
     def _rerank_results(self, query: str, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Re-rank results using multiple factors"""
-        for result in results:
-            score = 0.0
-            
-            # Base relevance score
-            score += result.get('relevance_score', 0.0) * 0.4
-            
-            # Text length bonus (prefer substantial chunks)
-            text_length = len(result.get('text', ''))
-            if text_length > 100:
-                score += min(0.2, text_length / 1000)
-            
-            # Recency bonus
-            metadata = result.get('metadata', {})
-            created_time = metadata.get('created_timestamp')
-            if created_time:
-                try:
-                    created_dt = datetime.fromisoformat(created_time.replace('Z', '+00:00'))
-                    days_old = (datetime.now(created_dt.tzinfo) - created_dt).days
-                    if days_old < 30:
-                        score += 0.1
-                except:
-                    pass
-            
-            # Category relevance bonus
-            query_lower = query.lower()
-            category = metadata.get('category', '').lower()
-            if category in query_lower:
-                score += 0.1
-            
-            # Update score
+        if not results:
+            return results
+        
+        # Score every result at once from column arrays rather than row by row
+        count = len(results)
+        metadatas = [result.get('metadata', {}) for result in results]
+        relevance = np.fromiter((result.get('relevance_score', 0.0) for result in results), dtype=np.float64, count=count)
+        lengths = np.fromiter((len(result.get('text', '')) for result in results), dtype=np.float64, count=count)
+        created = self._parse_timestamps([metadata.get('created_timestamp') for metadata in metadatas])
+        query_lower = query.lower()
+        category_match = np.fromiter(
+            (metadata.get('category', '').lower() in query_lower for metadata in metadatas), dtype=bool, count=count
+        )
+        
+        # Base relevance, a bonus for substantial chunks, recency (NaT never counts) and category
+        scores = relevance * 0.4
+        scores += np.where(lengths > 100, np.minimum(0.2, lengths / 1000), 0.0)
+        scores += 0.1 * (created > np.datetime64(datetime.utcnow(), 's') - np.timedelta64(30, 'D'))
+        scores += 0.1 * category_match
+        
+        for result, score in zip(results, scores.tolist()):
             result['final_score'] = score
         
         # Sort by final score
         results.sort(key=lambda x: x.get('final_score', 0), reverse=True)
         return results
     
+    def _parse_timestamps(self, values: List[Optional[str]]) -> np.ndarray:
+        """Parse ISO timestamps to datetime64 seconds, with NaT for missing or malformed values"""
+        # The first 19 characters are the date and time; fractions and offsets are dropped
+        strings = [value[:19] if isinstance(value, str) else '' for value in values]
+        try:
+            return np.array(strings, dtype='datetime64[s]')
+        except ValueError:
+            parsed = np.full(len(strings), np.datetime64('NaT'), dtype='datetime64[s]')
+            for i, value in enumerate(strings):
+                try:
+                    parsed[i] = np.datetime64(value, 's')
+                except ValueError:
+                    pass
+            return parsed
+    
     def _enhance_search_results(self, query: str, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Enhance search results using AI analysis"""
         try:
             if not results:
                 return results
             
-            # Create context for AI enhancement
-            context = f"Query: {query}\n\nTop results:\n"
-            for i, result in enumerate(results[:3]):  # Top 3 results
-                context += f"{i+1}. {result.get('text', '')[:200]}...\n"
+            # A near-exact hit already answers the query, and a one-word query gives
+            # the model nothing to analyse; neither is worth a round trip
+            best_score = max(result.get('relevance_score', 0.0) for result in results)
+            if best_score > self.enhancement_skip_score or len(query.split()) < 2:
+                return results
             
-            # AI prompt for result enhancement
-            prompt = f"""Analyze the search results for the query: "{query}"
+            prompt = self._analysis_prompt(query, results)
+            
+            # The prompt holds the query and the top result texts, so identical prompts share an analysis
+            cache_key = hashlib.blake2b(prompt.encode('utf-8'), digest_size=16).hexdigest()
+            cached = self._get_cached(self.enhancement_cache, cache_key)
+            if cached is not None and time.monotonic() - cached[0] < self.enhancement_cache_ttl:
+                # Add AI insights to results
+                for result in results:
+                    result['ai_analysis'] = cached[1]
+                return results
+            
+            # Otherwise hand back an ID the client can poll with get_search_analysis
+            analysis_id = uuid.uuid4().hex
+            future = self.executor.submit(self._analyze_search_results, prompt, cache_key)
+            with self._analysis_futures_lock:
+                self.analysis_futures[analysis_id] = future
+                if len(self.analysis_futures) > self.analysis_futures_size:
+                    self.analysis_futures.popitem(last=False)
+            
+            for result in results:
+                result['analysis_id'] = analysis_id
+            
+        except Exception as e:
+            print(f"AI enhancement failed: {e}")
+            # Continue without AI enhancement
+        
+        return results
+    
+    def _embed_queries(self, texts: List[str]) -> np.ndarray:
+        """Embed query texts through the cache and the shared batcher, one row per text"""
+        keys = [hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest() for text in texts]
+        embeddings = [self._get_cached(self.query_embedding_cache, key) for key in keys]
+        
+        # Queue every miss before waiting, so they land in the same batch
+        pending = {i: self.embedding_batcher.encode_async(texts[i]) for i, embedding in enumerate(embeddings) if embedding is None}
+        for i, future in pending.items():
+            embeddings[i] = future.result()
+            self._store_cached(self.query_embedding_cache, keys[i], embeddings[i], self.query_embedding_cache_size)
+        
+        # float32 end to end; Chroma takes the 2-D array as is
+        return np.stack(embeddings).astype(np.float32, copy=False)
+    
+    def _analysis_prompt(self, query: str, results: List[Dict[str, Any]]) -> str:
+        """Build the AI analysis prompt from the query and the top results"""
+        # Create context for AI enhancement
+        context = f"Query: {query}\n\nTop results:\n"
+        for i, result in enumerate(results[:3]):  # Top 3 results
+            context += f"{i+1}. {result.get('text', '')[:200]}...\n"
+        
+        # AI prompt for result enhancement
+        return f"""Analyze the search results for the query: "{query}"
 
 Context:
 {context}
@@ -347,56 +594,70 @@ Provide insights on:
 4. Overall relevance assessment
 
 Format as JSON with keys: analysis, gaps, follow_up_questions, relevance_score"""
-
-            # Get AI enhancement
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are an AI search analyst. Provide concise, helpful analysis of search results."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=300,
-                temperature=0.3
-            )
-            
-            ai_analysis = response.choices[0].message.content
-            
-            # Try to parse AI response
-            try:
-                analysis_data = json.loads(ai_analysis)
-                # Add AI insights to results
-                for result in results:
-                    result['ai_analysis'] = analysis_data
-            except:
-                # If parsing fails, add raw AI response
-                for result in results:
-                    result['ai_analysis'] = {'raw_response': ai_analysis}
-            
-        except Exception as e:
-            print(f"AI enhancement failed: {e}")
-            # Continue without AI enhancement
+    
+    def _analyze_search_results(self, prompt: str, cache_key: str) -> Dict[str, Any]:
+        """Ask the model for a search analysis and cache it; runs on the executor"""
+        response = self.client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": "You are an AI search analyst. Provide concise, helpful analysis of search results."},
+                {"role": "user", "content": prompt}
+            ],
+            response_format={"type": "json_object"},
+            max_tokens=300,
+            temperature=0.3
+        )
         
-        return results
+        ai_analysis = response.choices[0].message.content
+        
+        # JSON mode only breaks if the reply is cut off at max_tokens
+        try:
+            analysis_data = json.loads(ai_analysis)
+        except json.JSONDecodeError:
+            analysis_data = {'raw_response': ai_analysis}
+        
+        self._store_cached(self.enhancement_cache, cache_key, (time.monotonic(), analysis_data), self.enhancement_cache_size)
+        return analysis_data
+    
+    def get_search_analysis(self, analysis_id: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Wait for a background search analysis; None if the analysis ID is unknown"""
+        with self._analysis_futures_lock:
+            future = self.analysis_futures.get(analysis_id)
+        if future is None:
+            return None
+        
+        # Raises concurrent.futures.TimeoutError if still running after timeout
+        return {
+            'analysis_id': analysis_id,
+            'processing_status': 'completed',
+            'ai_analysis': future.result(timeout=timeout)
+        }
+    
+    def _get_cached(self, cache: OrderedDict, cache_key: str) -> Optional[Any]:
+        """Return a cached value, marking the entry as recently used"""
+        with self._cache_lock:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                cache.move_to_end(cache_key)
+            return cached
+    
+    def _store_cached(self, cache: OrderedDict, cache_key: str, value: Any, max_size: int) -> None:
+        """Cache a value, evicting the least recently used entry when full"""
+        with self._cache_lock:
+            cache[cache_key] = value
+            cache.move_to_end(cache_key)
+            if len(cache) > max_size:
+                cache.popitem(last=False)
     
     def delete_document(self, document_id: str, user_id: str) -> bool:
-        """Delete a document and all its chunks from the knowledge base"""
+        """Delete a document and all its chunks from the knowledge base; True once none remain"""
         try:
             if not self.collection:
                 return False
             
-            # Find all chunks for this document
-            results = self.collection.query(
-                query_texts=[""],
-                n_results=1000,
-                where={"document_id": document_id, "user_id": user_id}
-            )
-            
-            if results and 'ids' in results and results['ids']:
-                # Delete all chunks
-                self.collection.delete(ids=results['ids'][0])
-                return True
-            
-            return False
+            # Chroma finds and deletes the matching chunks in one call, however many there are
+            self.collection.delete(where=_build_where({"document_id": document_id, "user_id": user_id}))
+            return True
             
         except Exception as e:
             print(f"Failed to delete document: {e}")
@@ -408,29 +669,20 @@ Format as JSON with keys: analysis, gaps, follow_up_questions, relevance_score""
             if not self.collection:
                 return {}
             
-            # Get collection info
-            collection_info = self.collection.get()
-            
-            # Count documents by user
-            user_docs = self.collection.query(
-                query_texts=[""],
-                n_results=1000,
-                where={"user_id": user_id}
-            )
-            
-            doc_count = len(user_docs['ids'][0]) if user_docs and 'ids' in user_docs else 0
+            # Count documents by user from their metadata alone
+            user_chunks = self.collection.get(where={"user_id": user_id}, include=["metadatas"])
+            doc_count = len(user_chunks['ids'])
             
             # Analyze document types
             doc_types = {}
-            if user_docs and 'metadatas' in user_docs:
-                for metadata in user_docs['metadatas'][0]:
-                    doc_type = metadata.get('document_type', 'unknown')
-                    doc_types[doc_type] = doc_types.get(doc_type, 0) + 1
+            for metadata in user_chunks['metadatas']:
+                doc_type = metadata.get('document_type', 'unknown')
+                doc_types[doc_type] = doc_types.get(doc_type, 0) + 1
             
             return {
                 'total_chunks': doc_count,
                 'document_types': doc_types,
-                'collection_size': len(collection_info['ids']) if collection_info else 0,
+                'collection_size': self.collection.count(),
                 'last_updated': datetime.utcnow().isoformat()
             }
             
@@ -0,0 +1,70 @@
+import logging
+import queue
+import threading
+import time
+from typing import Dict, Any, List, Tuple
+
+logger = logging.getLogger('voiceloop.telemetry')
+
+class TelemetryService:
+    def __init__(self, flush_interval: float = 0.1, batch_size: int = 500):
+        self.flush_interval = flush_interval  # seconds
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._thread = None
+        self._app = None
+        self._db = None
+    
+    def start(self, app, db) -> None:
+        """Start the background thread that writes queued telemetry rows"""
+        if self._thread is not None:
+            return
+        
+        self._app = app
+        self._db = db
+        self._thread = threading.Thread(target=self._run, name='telemetry-writer', daemon=True)
+        self._thread.start()
+    
+    def enqueue(self, model, row: Dict[str, Any]) -> None:
+        """Queue a row for insertion into the model's table without blocking the caller"""
+        self._queue.put((model, row))
+    
+    def _run(self) -> None:
+        """Drain the queue forever, flushing every batch_size rows or flush_interval seconds"""
+        while True:
+            batch = self._collect_batch()
+            self._flush(batch)
+    
+    def _collect_batch(self) -> List[Tuple[Any, Dict[str, Any]]]:
+        """Block for the first row, then gather more until the batch is full or the interval ends"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        
+        return batch
+    
+    def _flush(self, batch: List[Tuple[Any, Dict[str, Any]]]) -> None:
+        """Insert a batch with one executemany per table and a single commit"""
+        rows_by_model = {}
+        for model, row in batch:
+            rows_by_model.setdefault(model, []).append(row)
+        
+        try:
+            with self._app.app_context():
+                try:
+                    for model, rows in rows_by_model.items():
+                        self._db.session.execute(self._db.insert(model), rows)
+                    self._db.session.commit()
+                except Exception:
+                    self._db.session.rollback()
+                    raise
+        except Exception:
+            logger.exception("Failed to write telemetry batch of %d rows", len(batch))
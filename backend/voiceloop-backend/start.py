@@ -22,7 +22,7 @@ def check_dependencies():
     """Check if required dependencies are installed"""
     required_packages = [
         'flask', 'openai', 'chromadb', 'sentence-transformers',
-        'PyPDF2', 'python-docx', 'whisper'
+        'pypdfium2', 'python-docx', 'faster-whisper'
     ]
     
     missing_packages = []
@@ -89,7 +89,8 @@ def start_server():
     
     try:
         # Import and run the app
-        from app import app
+        from app import create_app
+        app = create_app()
         
         print("✅ Server initialized successfully")
         print("🌐 Server will be available at: http://localhost:5000")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the backend packages (models, services) from the project root
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
@@ -0,0 +1,47 @@
+import pytest
+from flask import Flask
+
+import app as voiceloop_app
+from models.database import db
+from models.document_models import UploadedFile, DocumentAnalysis
+
+@pytest.fixture
+def client(tmp_path):
+    # The routes without create_app's services; listing documents only needs the database
+    app = Flask(__name__)
+    app.json = voiceloop_app.ORJSONProvider(app)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'documents.db'}"
+    db.init_app(app)
+    app.register_blueprint(voiceloop_app.api)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            _uploaded_file('analysed', 'u1'),
+            _uploaded_file('pending', 'u1'),
+            _uploaded_file('other-user', 'u2'),
+            DocumentAnalysis(file_id='analysed', summary='Quarterly numbers')
+        ])
+        db.session.commit()
+    return app.test_client()
+
+def _uploaded_file(file_id, user_id):
+    return UploadedFile(
+        id=file_id, filename=f'{file_id}.pdf', original_filename=f'{file_id}.pdf',
+        file_path=f'/uploads/{file_id}.pdf', file_size=1024, mime_type='application/pdf',
+        file_hash='0' * 64, user_id=user_id
+    )
+
+def test_lists_only_the_users_documents_with_analysis_flags(client):
+    response = client.get('/api/documents', query_string={'user_id': 'u1'})
+    
+    assert response.status_code == 200
+    documents = {doc['id']: doc for doc in response.get_json()['documents']}
+    assert set(documents) == {'analysed', 'pending'}
+    assert documents['analysed']['has_analysis'] is True
+    assert documents['pending']['has_analysis'] is False
+    assert documents['analysed']['upload_timestamp'] is not None
+
+def test_listing_requires_a_user_id(client):
+    response = client.get('/api/documents')
+    
+    assert response.status_code == 400
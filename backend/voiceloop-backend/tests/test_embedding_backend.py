@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from services import rag_service
+from services.rag_service import EmbeddingBackend
+
+class FakeStorageView:
+    """Mimics a CTranslate2 StorageView: only host-resident views convert to numpy"""
+    
+    def __init__(self, array, device):
+        self.array = array
+        self.device = device
+        self.moved_to = None
+    
+    def to_device(self, device):
+        self.moved_to = device
+        return FakeStorageView(self.array, 'cpu')
+    
+    def __array__(self, dtype=None, copy=None):
+        if self.device != 'cpu':
+            raise TypeError('StorageView on cuda has no array interface')
+        return self.array if dtype is None else self.array.astype(dtype)
+
+class FakeEncoder:
+    """Returns one hidden vector per token, with nonzero padding so masking is exercised"""
+    
+    def __init__(self, device):
+        self.device = device
+        self.outputs = []
+    
+    def forward_batch(self, input_ids, token_type_ids=None):
+        width = max(len(ids) for ids in input_ids)
+        hidden = np.full((len(input_ids), width, 2), 100.0, dtype=np.float32)
+        for row, ids in enumerate(input_ids):
+            hidden[row, :len(ids)] = [[token, 1.0] for token in ids]
+        view = FakeStorageView(hidden, self.device)
+        self.outputs.append(view)
+        return SimpleNamespace(last_hidden_state=view)
+
+def make_backend(device):
+    backend = EmbeddingBackend.__new__(EmbeddingBackend)
+    backend.tokenizer = lambda texts, **kwargs: {'input_ids': [[len(word) for word in text.split()] for text in texts]}
+    backend.encoder = FakeEncoder(device)
+    backend.dimension = None
+    return backend
+
+@pytest.fixture(autouse=True)
+def ct2_device(monkeypatch):
+    # Only the device constant is needed; the encoder itself is faked
+    monkeypatch.setattr(rag_service.ctranslate2, 'Device', SimpleNamespace(cpu='cpu-device'), raising=False)
+
+@pytest.mark.parametrize('device', ['cpu', 'cuda'])
+def test_encode_mean_pools_real_tokens_in_input_order(device):
+    backend = make_backend(device)
+    
+    embeddings = backend.encode(['aaaa bb', 'c'])
+    
+    np.testing.assert_allclose(embeddings, [[3.0, 1.0], [1.0, 1.0]])
+    assert embeddings.dtype == np.float32
+
+def test_encode_copies_cuda_output_to_host():
+    backend = make_backend('cuda')
+    
+    backend.encode(['one two'])
+    
+    assert backend.encoder.outputs[0].moved_to == 'cpu-device'
+
+def test_encode_leaves_cpu_output_in_place():
+    backend = make_backend('cpu')
+    
+    backend.encode(['one two'])
+    
+    assert backend.encoder.outputs[0].moved_to is None
@@ -0,0 +1,58 @@
+import pytest
+
+from services.mcp_calendar import MCPCalendarService
+
+@pytest.fixture
+def service():
+    # Rule parsing needs no clients or caches
+    return MCPCalendarService.__new__(MCPCalendarService)
+
+def test_complete_create_command_is_confident(service):
+    intent = service._rule_based_parsing("Schedule a meeting with Sam tomorrow at 3pm")
+    
+    assert intent['action'] == 'create'
+    assert intent['event_details']['title'] == 'Sam'
+    assert intent['time_expressions'] == ['tomorrow', 'at 3pm']
+    assert intent['confidence'] == 1.0
+
+@pytest.mark.parametrize('command', [
+    "Reschedule my meeting with Sam to tomorrow at 3pm",
+    "Move my meeting with Sam to tomorrow at 3pm",
+    "Change my meeting with Sam to tomorrow at 3pm"
+])
+def test_rescheduling_is_an_update(service, command):
+    intent = service._rule_based_parsing(command)
+    
+    assert intent['action'] == 'update'
+    assert intent['event_details']['title'] == 'Sam'
+
+def test_action_words_only_match_whole_words(service):
+    # "address" and "showroom" contain "add" and "show"
+    intent = service._rule_based_parsing("Cancel the meeting with Sam at the showroom address tomorrow at 3pm")
+    
+    assert intent['action'] == 'delete'
+
+@pytest.mark.parametrize('command', [
+    "Don't schedule a meeting with Sam tomorrow at 3pm",
+    "Do not cancel the meeting with Sam tomorrow at 3pm",
+    "Never book a call with Sam tomorrow at 3pm"
+])
+def test_negated_commands_are_never_confident(service, command):
+    assert service._rule_based_parsing(command)['confidence'] == 0.0
+
+def test_time_in_location_is_not_confident(service):
+    intent = service._rule_based_parsing("Schedule a meeting with Sam tomorrow in 2 hours")
+    
+    assert intent['confidence'] == 0.0
+
+def test_partial_command_scores_found_features(service):
+    intent = service._rule_based_parsing("Schedule a meeting tomorrow")
+    
+    assert intent['action'] == 'create'
+    assert 'title' not in intent['event_details']
+    assert intent['confidence'] == 0.7
+
+def test_conflicting_actions_drop_action_score(service):
+    intent = service._rule_based_parsing("Cancel and reschedule the meeting with Sam tomorrow at 3pm")
+    
+    assert intent['confidence'] == 0.65
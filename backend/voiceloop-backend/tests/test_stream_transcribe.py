@@ -0,0 +1,48 @@
+import json
+import logging
+
+import pytest
+from flask import Flask
+
+import app as voiceloop_app
+
+class FakeFileProcessor:
+    """Streams fixed words, optionally failing once they are sent"""
+    
+    def __init__(self, error=None):
+        self.error = error
+    
+    def read_pcm16_stream(self, stream):
+        return iter(())
+    
+    def stream_transcribe(self, audio_chunks):
+        yield 'hello'
+        yield ' world'
+        if self.error:
+            raise self.error
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(voiceloop_app.api)
+    return app.test_client()
+
+def test_streams_words(client, monkeypatch):
+    monkeypatch.setattr(voiceloop_app, 'file_processor', FakeFileProcessor())
+    
+    response = client.post('/api/voice/transcribe/stream', data=b'')
+    
+    assert response.status_code == 200
+    assert response.get_data(as_text=True) == 'hello world'
+
+def test_error_mid_stream_ends_with_an_error_line(client, monkeypatch, caplog):
+    monkeypatch.setattr(voiceloop_app, 'file_processor', FakeFileProcessor(RuntimeError('decode failed')))
+    
+    with caplog.at_level(logging.ERROR, logger='voiceloop.api'):
+        response = client.post('/api/voice/transcribe/stream', data=b'')
+        body = response.get_data(as_text=True)
+    
+    words, error_line = body.rstrip('\n').rsplit('\n', 1)
+    assert words == 'hello world'
+    assert json.loads(error_line) == {'error': 'decode failed'}
+    assert 'Streaming transcription failed' in caplog.text
@@ -0,0 +1,57 @@
+import time
+
+import pytest
+from flask import Flask
+
+from models.database import db
+from models.document_models import UploadedFile  # noqa: F401  (target of knowledge_documents' foreign key)
+from models.calendar_models import MCPCommand
+from models.knowledge_models import SearchQuery
+from services.telemetry_service import TelemetryService
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'telemetry.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+def test_flush_writes_rows_for_every_model(app):
+    telemetry = TelemetryService()
+    telemetry.start(app, db)
+    telemetry._flush([
+        (SearchQuery, {'user_id': 'u1', 'query_text': 'quarterly budget', 'results_count': 3}),
+        (MCPCommand, {'user_id': 'u1', 'command_text': 'schedule standup', 'command_type': 'calendar', 'parsed_intent': '{}', 'success': True})
+    ])
+    
+    with app.app_context():
+        query = db.session.execute(db.select(SearchQuery)).scalar_one()
+        command = db.session.execute(db.select(MCPCommand)).scalar_one()
+    assert (query.user_id, query.query_text, query.results_count) == ('u1', 'quarterly budget', 3)
+    assert command.command_text == 'schedule standup'
+
+def test_enqueued_rows_reach_the_database(app):
+    telemetry = TelemetryService(flush_interval=0.01)
+    telemetry.start(app, db)
+    telemetry.enqueue(SearchQuery, {'user_id': 'u2', 'query_text': 'hiring plan'})
+    
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        with app.app_context():
+            rows = db.session.execute(db.select(SearchQuery.query_text)).scalars().all()
+        if rows:
+            break
+        time.sleep(0.01)
+    assert rows == ['hiring plan']
+
+def test_failed_batch_is_logged(app, caplog):
+    telemetry = TelemetryService()
+    telemetry.start(app, db)
+    # query_text is NOT NULL, so the insert fails
+    telemetry._flush([(SearchQuery, {'user_id': 'u3', 'query_text': None})])
+    
+    assert 'Failed to write telemetry batch of 1 rows' in caplog.text
+    with app.app_context():
+        assert db.session.execute(db.select(SearchQuery)).first() is None
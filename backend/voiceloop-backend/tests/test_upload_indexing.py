@@ -0,0 +1,64 @@
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+from services.file_processor import FileProcessingService
+
+class FakeRAGService:
+    """Records indexing requests and resolves each to a fixed document ID"""
+    
+    def __init__(self, error=None):
+        self.calls = []
+        self.error = error
+    
+    def process_document_async(self, document_text, metadata, user_id):
+        self.calls.append((document_text, metadata, user_id))
+        future = Future()
+        if self.error:
+            future.set_exception(self.error)
+        else:
+            future.set_result(f'doc-{len(self.calls)}')
+        return future
+
+def make_service(rag_service):
+    service = FileProcessingService.__new__(FileProcessingService)
+    service.rag_service = rag_service
+    service.supported_document_types = {'text/plain': 'txt'}
+    service.supported_audio_types = {}
+    return service
+
+FILE_META = SimpleNamespace(filename='notes.txt', content_type='text/plain')
+
+def test_indexing_is_queued_before_analysis_and_its_id_returned():
+    rag_service = FakeRAGService()
+    service = make_service(rag_service)
+    queued_before_analysis = []
+    service.analyze_content_with_ai = lambda text, file, file_hash: queued_before_analysis.append(len(rag_service.calls)) or {'summary': 'Notes'}
+    
+    result = service._analyze_and_index('Meeting notes', FILE_META, 'hash', 'u1')
+    
+    assert queued_before_analysis == [1]
+    assert rag_service.calls == [('Meeting notes', {'title': 'notes.txt', 'type': 'TXT'}, 'u1')]
+    assert result == {'analysis': {'summary': 'Notes'}, 'rag_document_id': 'doc-1'}
+
+def test_batch_indexes_every_file_with_text():
+    rag_service = FakeRAGService()
+    service = make_service(rag_service)
+    service.analyze_many = lambda texts, files, file_hashes: [{'summary': text} for text in texts]
+    
+    results = service._analyze_and_index_many(['first', '  ', 'third'], [FILE_META] * 3, ['a', 'b', 'c'], 'u1')
+    
+    assert [result['rag_document_id'] for result in results] == ['doc-1', None, 'doc-2']
+
+def test_indexing_failure_keeps_the_analysis():
+    service = make_service(FakeRAGService(error=RuntimeError('chroma unavailable')))
+    service.analyze_content_with_ai = lambda text, file, file_hash: {'summary': 'Notes'}
+    
+    result = service._analyze_and_index('Meeting notes', FILE_META, 'hash', 'u1')
+    
+    assert result == {'analysis': {'summary': 'Notes'}, 'rag_document_id': None}
+
+def test_nothing_is_indexed_without_a_rag_service():
+    service = make_service(None)
+    service.analyze_content_with_ai = lambda text, file, file_hash: {'summary': 'Notes'}
+    
+    assert service._analyze_and_index('Meeting notes', FILE_META, 'hash', 'u1')['rag_document_id'] is None
@@ -46,6 +46,7 @@ export interface RAGSearchResult {
   category: string;
   tags: string[];
   ai_analysis?: any;
+  analysis_id?: string;
 }
 
 export interface CalendarEvent {
@@ -75,10 +76,18 @@ export interface MCPCommandResult {
 export interface FileUploadResult {
   success: boolean;
   file_id: string;
-  analysis: DocumentAnalysis;
+  processing_status: string;
   message: string;
 }
 
+// AI analysis runs after the upload returns; poll for it with getFileAnalysis
+export interface FileAnalysisResult {
+  file_id: string;
+  processing_status: 'processing' | 'completed';
+  analysis?: Partial<DocumentAnalysis> & { [key: string]: any };
+  rag_document_id?: string | null;
+}
+
 export interface RAGSearchParams {
   query: string;
   user_id: string;
@@ -157,6 +166,19 @@ class VoiceLoopService {
     }
   }
 
+  // Wait up to timeoutSeconds for a file's background analysis; 'processing' means try again later
+  async getFileAnalysis(fileId: string, timeoutSeconds: number = 20): Promise<FileAnalysisResult> {
+    try {
+      const response = await this.apiClient.get(`/files/${encodeURIComponent(fileId)}/analysis`, {
+        params: { timeout: timeoutSeconds },
+      });
+      return response.data;
+    } catch (error) {
+      console.error('Failed to get file analysis:', error);
+      throw error;
+    }
+  }
+
   // Get user documents
   async getDocuments(userId: string): Promise<VoiceLoopDocument[]> {
     try {
@@ -322,7 +344,7 @@ class VoiceLoopService {
           results.push({
             success: false,
             file_id: '',
-            analysis: {} as DocumentAnalysis,
+            processing_status: 'failed',
             message: `Failed to process ${file.name}: ${error}`,
           });
         }